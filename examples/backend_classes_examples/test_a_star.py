@@ -69,14 +69,14 @@ if __name__ == "__main__":
     # print(lst)
 
     # Run A* on the layout.
-    sch.paths = sch.run_a_star()
+    sch.paths, failed_connection, routing_stats = sch.run_a_star()
     for path in sch.paths:
         path_id = path["path_id"]
-        path_nodes = path["path_nodes"]
+        path_nodes = classes.path_cells(path["corners"])
         path_length = path["length"]
         print(
             f"Path: {path_id}\nPath nodes: {path_nodes}\nLength: {path_length}")
     if sch.paths == []:
-        print(f"No valid path")
+        print(f"No valid path, failed connection: {failed_connection}")
 
     # sch.overwrite_save("a_star_test_out")
@@ -0,0 +1,59 @@
+import classes
+import tempfile
+
+
+# A ring of resistors with a capacitor across two of them. ring_ids are the resistor ids around the
+# ring, capacitor_id is the capacitor's, and capacitor_pins is which pin (ring index, pin) each of the
+# capacitor's pins is wired to. The components get added in order of id.
+def make_circuit(ring_ids, capacitor_id, capacitor_pins=[[0, 0], [2, 1]]):
+    sch = classes.Schematic()
+    for id in sorted(ring_ids + [capacitor_id]):
+        sch.add_component({"id": id, "component_type": "Capacitor" if id == capacitor_id else "Resistor"})
+    for k in range(0, 6):
+        sch.add_connection(f"{ring_ids[k]}_1", f"{ring_ids[(k + 1) % 6]}_0")
+    for pin, (k, ring_pin) in enumerate(capacitor_pins):
+        sch.add_connection(f"{capacitor_id}_{pin}", f"{ring_ids[k]}_{ring_pin}")
+    sch.set_monte_carlo_parameters(10, 4, .9)
+    return sch
+
+
+if __name__ == "__main__":
+    sch_1 = make_circuit([0, 1, 2, 3, 4, 5], 6)
+    # The same circuit with other ids, so it gets added in another order
+    sch_2 = make_circuit([23, 25, 20, 26, 21, 22], 24)
+    # The same nets, but one of the capacitor's pins is wired to the other pin on its net
+    sch_3 = make_circuit([0, 1, 2, 3, 4, 5], 6, [[5, 1], [2, 1]])
+
+    print(f"Same topology_key: {sch_1.topology_key() == sch_2.topology_key()}")
+    print(f"Different topology_key when rewired: {sch_1.topology_key() != sch_3.topology_key()}")
+
+    # The mapping has to keep the component types and which pins are wired together
+    mapping = classes.find_isomorphism(sch_1.topology_graph(), sch_2.topology_graph())
+    if mapping == None:
+        print("No mapping found")
+    else:
+        def mapped_pin(pin_id):
+            component_key = mapping[f"component_{pin_id.split('_')[0]}"]
+            return f"{component_key.split('_')[1]}_{pin_id.split('_')[1]}"
+        same_types = all(sch_2.components[mapping[component_key]].__class__ == component.__class__
+                         for component_key, component in sch_1.components.items())
+        sch_1.initialize_connections_list()
+        sch_2.initialize_connections_list()
+        connections_2 = [sorted(connection) for connection in sch_2.connections_list]
+        same_connections = all(sorted(mapped_pin(pin_id) for pin_id in connection) in connections_2
+                               for connection in sch_1.connections_list)
+        print(f"Mapping: {mapping}")
+        print(f"Same types: {same_types}, same connections: {same_connections}")
+    print(f"Mapping when rewired: {classes.find_isomorphism(sch_1.topology_graph(), sch_3.topology_graph())}")
+
+    # A placement sch_1 got into the library has to route on sch_2 too
+    with tempfile.TemporaryDirectory() as library_dir:
+        sch_1.placement_library = classes.LayoutCache(library_dir)
+        sch_1.monte_carlo(300, seed=0)
+        print(f"\nLayout Score: {sch_1.curr_runs_score}")
+        sch_2.placement_library = classes.LayoutCache(library_dir)
+        library_layout = sch_2.get_library_layout()
+        if library_layout == None:
+            print("No library layout")
+        else:
+            print(f"Library Layout Score: {library_layout.score}")
@@ -50,7 +50,7 @@ if __name__ == "__main__":
     sch.monte_carlo(3000)
     for path in sch.paths:
         path_id = path["path_id"]
-        path_nodes = path["path_nodes"]
+        path_nodes = classes.path_cells(path["corners"])
         path_length = path["length"]
         print(
             f"Path: {path_id}\nPath nodes: {path_nodes}\nLength: {path_length}")
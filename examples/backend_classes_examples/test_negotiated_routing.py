@@ -0,0 +1,53 @@
+import classes
+import numpy as np
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors and a capacitor across two of them
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    sch.add_component({"id": 6, "component_type": "Capacitor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.add_connection("6_0", "0_0")
+    sch.add_connection("6_1", "2_1")
+    sch.set_monte_carlo_parameters(10, 4, .9)
+    sch.initialize_connections_list()
+
+    # Route random layouts with the negotiated router and the sequential a_star one. A negotiated
+    # layout is only legal if no two traces share a space, and no trace can be shorter than a_star
+    # gets for its connection on its own.
+    sch.rng = np.random.default_rng(0)
+    n_a_star_routed = 0
+    n_negotiated_routed = 0
+    n_wrong = 0
+    for placement in sch.sample_layouts(100):
+        pin_positions = sch.pin_placement(placement)
+        if sch.route_layout(placement, "sequential")[0].is_routed():
+            n_a_star_routed += 1
+        paths, failed_connection, routing_stats = sch.run_negotiated(pin_positions)
+        if paths == []:
+            continue
+        n_negotiated_routed += 1
+
+        pins = list(pin_positions.values())
+        used = []
+        for connection, path in zip(sch.connections_list, paths):
+            cells = classes.path_cells(path["corners"])
+            shortest = sch.run_a_star("a_star", pin_positions, [connection])[0]
+            if cells[0] != pin_positions[connection[0]] or cells[-1] != pin_positions[connection[1]] or \
+                    len(shortest) == 0 or path["length"] < shortest[0]["length"] or \
+                    any(cell in used or cell in pins for cell in cells[1:-1]):
+                n_wrong += 1
+                print(f"Path: {path['path_id']}\nPath nodes: {cells}\nLength: {path['length']}")
+            used += cells[1:-1]
+
+    print(f"a_star routed {n_a_star_routed} layouts, negotiated routed {n_negotiated_routed}, {n_wrong} paths wrong")
+
+    # Traces could cross diagonally without sharing a space, so it won't route with diagonal moves
+    sch.set_routing_parameters(8)
+    try:
+        sch.run_negotiated(pin_positions)
+        print("Negotiated routing with diagonal moves didn't raise")
+    except ValueError as e:
+        print(f"Diagonal moves: {e}")
@@ -0,0 +1,97 @@
+import classes
+import numpy as np
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors and a capacitor across two of them, so two of
+    # the nets have three pins
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    sch.add_component({"id": 6, "component_type": "Capacitor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.add_connection("6_0", "0_0")
+    sch.add_connection("6_1", "2_1")
+    sch.set_monte_carlo_parameters(10, 4, .9)
+    sch.initialize_connections_list()
+    print(f"Nets: {sch.get_nets()}")
+
+    # Route random layouts as net trees and with the sequential a_star router. Every net's traces
+    # have to join all of its pins, and traces from different nets can't share a space.
+    sch.rng = np.random.default_rng(0)
+    for connectivity in [4, 8]:
+        sch.set_routing_parameters(connectivity)
+        n_a_star_routed = 0
+        n_trees_routed = 0
+        a_star_length = 0
+        trees_length = 0
+        n_wrong = 0
+        n_junctions = 0
+        for placement in sch.sample_layouts(100):
+            pin_positions = sch.pin_placement(placement)
+            a_star_layout, routing_stats = sch.route_layout(placement, "sequential")
+            paths, failed_connection, routing_stats = sch.run_net_trees(pin_positions)
+            if a_star_layout.is_routed():
+                n_a_star_routed += 1
+            if paths == []:
+                continue
+            n_trees_routed += 1
+            if a_star_layout.is_routed():
+                a_star_length += sum(path["length"] for path in a_star_layout.paths)
+                trees_length += sum(path["length"] for path in paths)
+
+            # Which net every space the traces use belongs to
+            net_of_pin = {pin_id: n for n, net in enumerate(sch.get_nets()) for pin_id in net}
+            net_of_cell = {tuple(pin_positions[pin_id]): n for pin_id, n in net_of_pin.items()}
+            # And which net every diagonal step goes between (by the two spaces it cuts between)
+            net_of_crossing = {}
+            for path in paths:
+                n = net_of_pin[path["path_id"].split("->")[1]]
+                cells = classes.path_cells(path["corners"])
+                for cell in cells:
+                    if net_of_cell.setdefault(tuple(cell), n) != n:
+                        n_wrong += 1
+                        print(f"Path: {path['path_id']} runs into another net at {cell}")
+                for (i_1, j_1), (i_2, j_2) in zip(cells, cells[1:]):
+                    if i_1 != i_2 and j_1 != j_2:
+                        net_of_crossing[frozenset([(i_1, j_2), (i_2, j_1)])] = n
+            for path in paths:
+                n = net_of_pin[path["path_id"].split("->")[1]]
+                cells = classes.path_cells(path["corners"])
+                for cell_1, cell_2 in zip(cells, cells[1:]):
+                    if net_of_crossing.get(frozenset([tuple(cell_1), tuple(cell_2)]), n) != n:
+                        n_wrong += 1
+                        print(f"Path: {path['path_id']} crosses another net between {cell_1} and {cell_2}")
+
+            # Spread out from one pin of every net over its spaces, it has to reach all the others
+            for n, net in enumerate(sch.get_nets()):
+                cells = {cell for cell, cell_n in net_of_cell.items() if cell_n == n}
+                reached = {tuple(pin_positions[net[0]])}
+                to_visit = list(reached)
+                while len(to_visit) > 0:
+                    i, j = to_visit.pop()
+                    for di in [-1, 0, 1]:
+                        for dj in [-1, 0, 1]:
+                            if connectivity == 4 and di*dj != 0:
+                                continue
+                            neighbor = (i + di, j + dj)
+                            if neighbor in cells and not neighbor in reached:
+                                reached.add(neighbor)
+                                to_visit.append(neighbor)
+                if any(not tuple(pin_positions[pin_id]) in reached for pin_id in net):
+                    n_wrong += 1
+                    print(f"Net {net} isn't joined up")
+
+            # Branches start on other traces, but the pads still have to go on the pins (and only there)
+            layout = classes.Layout(placement, paths, sch.calculate_score(paths))
+            pins = list(pin_positions.values())
+            pads = sch.pad_positions(layout)
+            n_junctions += sum(not path["corners"][0].tolist() in pins for path in paths)
+            if any(not pad in pins for pad in pads) or len(pads) != len(pins):
+                n_wrong += 1
+                print(f"Pads: {pads} aren't on the pins")
+
+        print(f"Connectivity {connectivity}: a_star routed {n_a_star_routed} layouts, net trees routed "
+              f"{n_trees_routed}, {n_wrong} wrong")
+        print(f"Total length where both routed: a_star {a_star_length}, net trees {trees_length}")
+        print(f"Branches starting on a trace instead of a pin: {n_junctions}")
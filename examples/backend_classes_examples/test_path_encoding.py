@@ -0,0 +1,44 @@
+import classes
+import json
+import numpy as np
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.set_monte_carlo_parameters(6, 4, .9)
+    sch.initialize_connections_list()
+
+    # Every path has to come back the same after being saved (through json, like in a .circ file),
+    # and so does a path saved the old way with every grid space in "path_nodes"
+    sch.rng = np.random.default_rng(0)
+    n_checked = 0
+    n_wrong = 0
+    n_cells = 0
+    n_corners = 0
+    for connectivity in [4, 8]:
+        sch.set_routing_parameters(connectivity)
+        for placement in sch.sample_layouts(50):
+            pin_positions = sch.pin_placement(placement)
+            for connection in sch.connections_list:
+                for path in sch.run_a_star("a_star", pin_positions, [connection])[0]:
+                    n_checked += 1
+                    cells = classes.path_cells(path["corners"])
+                    n_cells += len(cells)
+                    n_corners += len(path["corners"])
+
+                    saved = json.loads(json.dumps(classes.encode_path(path)))
+                    old_saved = {"path_nodes": cells, "length": path["length"], "path_id": path["path_id"]}
+                    for loaded in [classes.decode_path(saved), classes.decode_path(old_saved)]:
+                        if (loaded["corners"] != path["corners"]).any() or loaded["corners"].shape != path["corners"].shape or \
+                                loaded["corners"].flags.writeable or loaded["length"] != path["length"] or \
+                                loaded["path_id"] != path["path_id"] or classes.path_cells(loaded["corners"]) != cells:
+                            n_wrong += 1
+                            print(f"Path: {path['path_id']}\nCorners: {path['corners'].tolist()}\n"
+                                  f"Loaded corners: {loaded['corners'].tolist()}")
+
+    print(f"Checked {n_checked} paths, {n_wrong} wrong")
+    print(f"{n_corners} corners for {n_cells} grid spaces")
@@ -0,0 +1,40 @@
+import classes
+import numpy as np
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.set_monte_carlo_parameters(6, 4, .9)
+    sch.initialize_connections_list()
+
+    # Route the same layouts twice. The second time every search has to come out of the cache,
+    # with the same paths (or the same connection failing) as the first time.
+    sch.rng = np.random.default_rng(0)
+    placements = sch.sample_layouts(50)
+    first = [sch.run_a_star("a_star", sch.pin_placement(placement)) for placement in placements]
+    hits = sch.route_cache.hits
+    misses = sch.route_cache.misses
+    second = [sch.run_a_star("a_star", sch.pin_placement(placement)) for placement in placements]
+    print(f"First run: {hits} hits, {misses} misses")
+    print(f"Second run: {sch.route_cache.hits - hits} hits, {sch.route_cache.misses - misses} misses")
+
+    n_wrong = 0
+    for (paths_1, failed_1, stats_1), (paths_2, failed_2, stats_2) in zip(first, second):
+        same_paths = len(paths_1) == len(paths_2) and all(
+            path_1["length"] == path_2["length"] and (path_1["corners"] == path_2["corners"]).all()
+            for path_1, path_2 in zip(paths_1, paths_2))
+        if not same_paths or failed_1 != failed_2:
+            n_wrong += 1
+            print(f"Different paths from the cache, failed connections: {failed_1}, {failed_2}")
+    print(f"Routed {sum(paths != [] for paths, failed, stats in first)} of {len(first)} layouts, "
+          f"{n_wrong} different from the cache")
+
+    # A small cache has to forget the oldest routes instead of growing
+    sch.route_cache = classes.RouteCache(max_size=10)
+    for placement in placements:
+        sch.run_a_star("a_star", sch.pin_placement(placement))
+    print(f"Routes kept with max_size 10: {len(sch.route_cache.routes)}")
@@ -0,0 +1,68 @@
+import classes
+import numpy as np
+
+# The connectivities every engine can route with (see PcbGrid.ROUTING_ENGINES)
+ENGINE_CONNECTIVITIES = {
+    "lee": [4],
+    "jps": [4],
+    "bidirectional": [4, 8]
+}
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.set_monte_carlo_parameters(6, 4, .9)
+    sch.initialize_connections_list()
+
+    # Route every connection on its own with each engine and with a_star on random layouts. They're
+    # all exact searches, so they have to route the same connections with paths just as short.
+    for engine, connectivities in ENGINE_CONNECTIVITIES.items():
+        sch.rng = np.random.default_rng(0)
+        n_checked = 0
+        n_wrong = 0
+        for connectivity in connectivities:
+            sch.set_routing_parameters(connectivity)
+            for placement in sch.sample_layouts(50):
+                pin_positions = sch.pin_placement(placement)
+                for connection in sch.connections_list:
+                    a_star_paths = sch.run_a_star("a_star", pin_positions, [connection])[0]
+                    engine_paths = sch.run_a_star(engine, pin_positions, [connection])[0]
+                    n_checked += 1
+                    if len(a_star_paths) != len(engine_paths):
+                        n_wrong += 1
+                        print(f"Only one engine routed {connection} with connectivity {connectivity}")
+                        continue
+                    if len(engine_paths) == 0:
+                        continue
+
+                    # The path has to go one space at a time, from pin to pin, around the other pins
+                    path = engine_paths[0]
+                    cells = classes.path_cells(path["corners"])
+                    steps = np.abs(np.diff(np.array(cells), axis=0))
+                    max_step = 1 if connectivity == 4 else 2
+                    other_pins = [pos for pin_id, pos in pin_positions.items() if not pin_id in connection]
+                    if path["length"] != a_star_paths[0]["length"] or steps.max() != 1 or \
+                            steps.sum(axis=1).max() > max_step or \
+                            cells[0] != pin_positions[connection[0]] or cells[-1] != pin_positions[connection[1]] or \
+                            any(cell in other_pins for cell in cells):
+                        n_wrong += 1
+                        print(f"{engine} path: {path['path_id']}\nPath nodes: {cells}\nLength: {path['length']} "
+                              f"(a_star: {a_star_paths[0]['length']})")
+
+        # The other connectivities have to be turned down instead of routed wrong
+        for connectivity in [4, 8]:
+            if connectivity in connectivities:
+                continue
+            sch.set_routing_parameters(connectivity)
+            try:
+                sch.run_a_star(engine, pin_positions)
+                n_wrong += 1
+                print(f"{engine} didn't raise with connectivity {connectivity}")
+            except ValueError:
+                pass
+
+        print(f"{engine}: checked {n_checked} connections, {n_wrong} wrong")
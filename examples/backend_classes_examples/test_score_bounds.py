@@ -0,0 +1,59 @@
+import classes
+import numpy as np
+
+if __name__ == "__main__":
+    # Create a schematic with a ring of resistors and a capacitor across two of them
+    sch = classes.Schematic()
+    for id in range(0, 6):
+        sch.add_component({"id": id, "component_type": "Resistor"})
+    sch.add_component({"id": 6, "component_type": "Capacitor"})
+    for id in range(0, 6):
+        sch.add_connection(f"{id}_1", f"{(id + 1) % 6}_0")
+    sch.add_connection("6_0", "0_0")
+    sch.add_connection("6_1", "2_1")
+    sch.set_monte_carlo_parameters(10, 4, .9)
+    sch.initialize_connections_list()
+
+    # Monte carlo skips a layout when score_upper_bound says it can't beat the best one, so no
+    # routed layout can ever score more than its bound
+    for router, connectivities in [["sequential", [4, 8]], ["negotiated", [4]], ["net_trees", [4, 8]]]:
+        for connectivity in connectivities:
+            sch.set_routing_parameters(connectivity)
+            sch.rng = np.random.default_rng(0)
+            n_routed = 0
+            n_wrong = 0
+            for placement in sch.sample_layouts(100):
+                layout = sch.route_layout(placement, router)[0]
+                if not layout.is_routed():
+                    continue
+                n_routed += 1
+                bound = sch.score_upper_bound(sch.pin_placement(placement), router)
+                if layout.score > bound:
+                    n_wrong += 1
+                    print(f"Score: {layout.score} is over its bound {bound}")
+            print(f"{router} with connectivity {connectivity}: {n_routed} routed, {n_wrong} over their bound")
+
+    # With score_to_beat, run_a_star stops an order once it can't beat it anymore. It can only stop
+    # orders that would have failed or scored no better, and anything it does route has to beat it.
+    sch.set_routing_parameters(4)
+    sch.rng = np.random.default_rng(1)
+    n_stopped = 0
+    n_wrong = 0
+    for placement in sch.sample_layouts(100):
+        pin_positions = sch.pin_placement(placement)
+        paths = sch.run_a_star("a_star", pin_positions)[0]
+        score = sch.calculate_score(paths) if paths != [] else -1
+        for score_to_beat in [.5, .7, .8, score - .01, score]:
+            bounded_paths = sch.run_a_star("a_star", pin_positions, score_to_beat=score_to_beat)[0]
+            if bounded_paths == None:
+                n_stopped += 1
+                if score > score_to_beat:
+                    n_wrong += 1
+                    print(f"Stopped an order scoring {score} that beats {score_to_beat}")
+            elif bounded_paths != [] and sch.calculate_score(bounded_paths) <= score_to_beat:
+                n_wrong += 1
+                print(f"Routed an order scoring {sch.calculate_score(bounded_paths)} that doesn't beat {score_to_beat}")
+            elif score > score_to_beat and len(bounded_paths) != len(paths):
+                n_wrong += 1
+                print(f"Routed an order differently with score_to_beat {score_to_beat}")
+    print(f"Stopped {n_stopped} orders early, {n_wrong} wrong")
@@ -0,0 +1,193 @@
+# Lays out a batch of .circ files without the GUI, a few at a time in separate processes.
+# For every circuit it writes the PCB image (.png) and the .circ with its layout saved in it,
+# and then a JSON summary of how every circuit went.
+#
+#   python batch_layout.py ../examples --out-dir layouts --workers 4
+#   python batch_layout.py "designs/**/*.circ" --grid 8 --padding 4 --target .9 --time-budget 60
+#
+# This doesn't import Qt, so it can run where there's no display.
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import classes
+
+# convert_to_pcb_image loads its font from here
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Every .circ file the inputs name: files, directories (the .circ files in them) and globs
+def find_circuits(inputs):
+    circ_files = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "*.circ")))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for circ_file in matches:
+            circ_file = os.path.abspath(circ_file)
+            if not circ_file in circ_files:
+                circ_files.append(circ_file)
+    return circ_files
+
+
+# The name every circuit's outputs get in the output directory. Circuits with the same
+# file name (from different directories) get a number after it.
+def output_names(circ_files):
+    names = []
+    for circ_file in circ_files:
+        base_name = os.path.splitext(os.path.basename(circ_file))[0]
+        name = base_name
+        i = 1
+        while name in names:
+            name = f"{base_name}({i})"
+            i += 1
+        names.append(name)
+    return names
+
+
+def init_worker():
+    os.chdir(SRC_DIR)
+
+
+# Loads one circuit, runs monte_carlo on it and writes its image and .circ. settings are the
+# monte_carlo options from the command line (None leaves what the .circ file has).
+# Returns this circuit's part of the summary.
+def layout_circuit(circ_file, png_file, out_circ_file, settings):
+    start_time = time.monotonic()
+    result = {"input": circ_file, "png": None, "circ": None}
+    try:
+        schematic = classes.Schematic()
+        schematic.load(circ_file)
+        schematic.set_monte_carlo_parameters(
+            schematic.n_grid_spaces if settings["grid"] == None else settings["grid"],
+            schematic.a_star_grid_padding if settings["padding"] == None else settings["padding"],
+            schematic.target_score if settings["target"] == None else settings["target"])
+
+        if settings["cache_dir"] != None:
+            schematic.layout_cache = classes.LayoutCache(
+                settings["cache_dir"], settings["cache_size"])
+        if settings["library_dir"] != None:
+            schematic.placement_library = classes.LayoutCache(
+                settings["library_dir"], settings["cache_size"])
+
+        schematic.monte_carlo(settings["max_iters"], engine=settings["engine"], router=settings["router"],
+                              seed=settings["seed"], time_budget=settings["time_budget"])
+        # A cached layout that doesn't reach the target score only gets searched past
+        result["cached"] = schematic.layout_cache != None and schematic.layout_cache.hits > 0 and \
+            schematic.routing_stats["searches"] == 0
+        result["routed"] = schematic.paths != None
+        result["score"] = float(schematic.curr_runs_score) if result["routed"] else None
+        result["target_score"] = schematic.target_score
+        result["routing_stats"] = schematic.routing_stats
+
+        if result["routed"]:
+            schematic.convert_to_pcb_image()
+            schematic.converted_image.save(png_file)
+            schematic.overwrite_save(out_circ_file)
+            result["png"] = png_file
+            result["circ"] = out_circ_file
+    except Exception as e:
+        result["routed"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    result["seconds"] = time.monotonic() - start_time
+    return result
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Lay out .circ files on PCBs without the GUI.")
+    parser.add_argument("inputs", nargs="+",
+                        help=".circ files, directories of them, or globs")
+    parser.add_argument("--out-dir", default="layouts",
+                        help="where the images, .circ files and summary go (default: layouts)")
+    parser.add_argument("--summary", default=None,
+                        help="where to write the JSON summary (default: OUT_DIR/summary.json)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="how many circuits to lay out at once (default: all the cpus)")
+    parser.add_argument("--grid", type=int, default=None,
+                        help="n_grid_spaces (default: what the .circ file has)")
+    parser.add_argument("--padding", type=int, default=None,
+                        help="a_star_grid_padding (default: what the .circ file has)")
+    parser.add_argument("--target", type=float, default=None,
+                        help="target_score (default: what the .circ file has)")
+    parser.add_argument("--max-iters", type=int, default=1000,
+                        help="monte_carlo iterations per circuit (default: 1000)")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds monte_carlo gets per circuit (default: no limit)")
+    parser.add_argument("--router", default="sequential", choices=sorted(classes.Schematic.ROUTERS),
+                        help="how layouts get routed (default: sequential)")
+    parser.add_argument("--engine", default="a_star", choices=sorted(classes.PcbGrid.ROUTING_ENGINES),
+                        help="search for the sequential router (default: a_star)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="makes the run repeatable (circuit i gets [seed, i])")
+    parser.add_argument("--cache-dir", default=None,
+                        help="a LayoutCache directory, so circuits laid out before come back right away")
+    parser.add_argument("--cache-size", type=int, default=50000000,
+                        help="how many bytes the cache (and the library) can take up (default: 50000000)")
+    parser.add_argument("--library-dir", default=None,
+                        help="a placement library directory, so circuits with the same topology as one "
+                             "laid out before start from its placement")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    circ_files = find_circuits(args.inputs)
+    if len(circ_files) == 0:
+        print("No .circ files found", file=sys.stderr)
+        return 1
+
+    out_dir = os.path.abspath(args.out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    summary_file = os.path.abspath(args.summary) if args.summary != None else \
+        os.path.join(out_dir, "summary.json")
+
+    jobs = []
+    for i, (circ_file, name) in enumerate(zip(circ_files, output_names(circ_files))):
+        settings = {"grid": args.grid, "padding": args.padding, "target": args.target,
+                    "max_iters": args.max_iters, "time_budget": args.time_budget,
+                    "router": args.router, "engine": args.engine,
+                    "cache_dir": None if args.cache_dir == None else os.path.abspath(args.cache_dir),
+                    "cache_size": args.cache_size,
+                    "library_dir": None if args.library_dir == None else os.path.abspath(args.library_dir),
+                    "seed": None if args.seed == None else [args.seed, i]}
+        jobs.append((circ_file, os.path.join(out_dir, f"{name}.png"),
+                     os.path.join(out_dir, f"{name}.circ"), settings))
+
+    start_time = time.monotonic()
+    results = {}
+    with ProcessPoolExecutor(args.workers, initializer=init_worker) as executor:
+        futures = {executor.submit(layout_circuit, *job): job[0]
+                   for job in jobs}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if "error" in result:
+                print(f"{result['input']}: {result['error']}")
+            elif result["routed"]:
+                print(f"{result['input']}: score {result['score']:.3f} in {result['seconds']:.1f}s" +
+                      (" (cached)" if result["cached"] else ""))
+            else:
+                print(
+                    f"{result['input']}: no layout found in {result['seconds']:.1f}s")
+
+    summary = {"settings": vars(args), "seconds": time.monotonic() - start_time,
+               "circuits": [results[circ_file] for circ_file in circ_files]}
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    if any("error" in result for result in summary["circuits"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
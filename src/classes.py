@@ -1,9 +1,15 @@
 from typing import Type
 import numpy as np
 import json
-from PyQt5 import QtWidgets, QtGui
+import heapq
+import hashlib
+from collections import OrderedDict
 from PIL import Image, ImageDraw, ImageFont
 import os.path
+import time
+import threading
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
 from xml.dom import minidom
 
 # set the transform.rotate(...) to one of these --- flip does not mirror, it just rotates by 180 degrees. (-Jason)
@@ -372,66 +378,353 @@ class Comment:
                 "position: {self.position}\n")
 
 
-# This class represents a grid point in a pcb grid space
-# it holds all of the basic stuff for use by A* (pseudo code from Sebastian Lague on YouTube) (-Jason)
-class GridNode:
-    def __init__(self, pos, taken):
-        self.pos = pos
-        self.taken = taken
-        self.g_cost = -1
-        self.h_cost = -1
-        self.parent = None
+# This class remembers routes that have already been found so the same search against the same
+# obstructions only ever gets done once (it's keyed on the start, goal, grid settings, engine, and
+# a hash of which grid spaces are taken). Monte carlo does that a lot: when the connections list
+# is reordered, every route up to the first connection that moved is the same as before.
+# It holds at most max_size routes and forgets the least recently used one first. Getting and
+# putting routes takes a lock, so more than one thread can route with the same cache.
+class RouteCache:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # The key for a search from start_node to goal_node on a grid as it is right now
+    def make_key(self, grid, start_node, goal_node, engine):
+        fingerprint = hashlib.blake2b(np.packbits(
+            grid.taken > 0).tobytes(), digest_size=16).digest()
+        return (start_node, goal_node, grid.dims, grid.connectivity, grid.heuristic_weight, engine, fingerprint)
+
+    # Returns the path's corners (see path_corners, empty if there wasn't one) or None if it isn't cached
+    def get(self, key):
+        with self.lock:
+            if key in self.routes:
+                self.hits += 1
+                self.routes.move_to_end(key)
+                return self.routes[key]
+            self.misses += 1
+            return None
+
+    # Remembers a path's corners, forgetting the least recently used one if it's full
+    def put(self, key, corners):
+        with self.lock:
+            self.routes[key] = corners
+            self.routes.move_to_end(key)
+            if len(self.routes) > self.max_size:
+                self.routes.popitem(last=False)
+
+    # Forget everything
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# This class keeps finished layouts on disk so a circuit that hasn't changed doesn't have to be
+# searched again (see Schematic.layout_key for what counts as a change). Every layout is a json file
+# in directory named after its key, and once they take up more than max_bytes the least recently
+# used ones get deleted. Files are written to a temporary name first, so more than one process
+# can share a directory.
+class LayoutCache:
+    def __init__(self, directory, max_bytes=50000000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def file_name(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    # Returns the layout ({"score", "paths", "pcb_positions"}) or None if it isn't cached
+    def get(self, key):
+        fn = self.file_name(key)
+        try:
+            with open(fn, "r") as f:
+                layout = json.load(f)
+            # Reading it counts as using it
+            os.utime(fn)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return layout
+
+    # Remembers a layout, then deletes the least recently used ones if there are too many
+    def put(self, key, layout):
+        fn = self.file_name(key)
+        temp_fn = f"{fn}.{os.getpid()}.tmp"
+        with open(temp_fn, "w") as f:
+            json.dump(layout, f)
+        os.replace(temp_fn, fn)
+        self.evict()
+
+    def evict(self):
+        cached_files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                fn = os.path.join(self.directory, name)
+                try:
+                    cached_files.append(
+                        (os.path.getmtime(fn), os.path.getsize(fn), fn))
+                # Another process got to it first
+                except FileNotFoundError:
+                    pass
+
+        total_bytes = sum(size for _, size, _ in cached_files)
+        for _, size, fn in sorted(cached_files):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(fn)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    # Forget everything
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+        self.hits = 0
+        self.misses = 0
+
+
+# A path is kept as a polyline: {"corners", "length", "path_id"}, where the corners are where the
+# trace starts, turns and ends, as a read-only int16 array of shape (corners, 2). Every step between
+# two corners goes the same way, so that's all it takes to get every grid space on it back
+# (see path_cells), and a long straight trace is only two corners.
+
+# The corners of a path given as every grid space on it (a list of positions)
+def path_corners(path_nodes):
+    corners = path_nodes[:1]
+    for prev_pos, pos, next_pos in zip(path_nodes, path_nodes[1:], path_nodes[2:]):
+        if pos[0] - prev_pos[0] != next_pos[0] - pos[0] or pos[1] - prev_pos[1] != next_pos[1] - pos[1]:
+            corners.append(pos)
+    if len(path_nodes) > 1:
+        corners.append(path_nodes[-1])
+    corners = np.array(corners, dtype=np.int16).reshape(-1, 2)
+    corners.flags.writeable = False
+    return corners
+
+
+# Every grid space on a path from its corners (a list of positions)
+def path_cells(corners):
+    corners = corners.tolist()
+    cells = corners[:1]
+    for (i_1, j_1), (i_2, j_2) in zip(corners, corners[1:]):
+        step_i = (i_2 > i_1) - (i_2 < i_1)
+        step_j = (j_2 > j_1) - (j_2 < j_1)
+        for k in range(1, max(abs(i_2 - i_1), abs(j_2 - j_1)) + 1):
+            cells.append([i_1 + k*step_i, j_1 + k*step_j])
+    return cells
+
+
+# A path the way it's saved: its corners as one flat list [i, j, i, j, ...]
+def encode_path(path):
+    return {"corners": path["corners"].ravel().tolist(), "length": path["length"], "path_id": path["path_id"]}
+
+
+# A saved path back the way it's kept. Files from before paths were polylines have every grid
+# space in "path_nodes" instead of the corners.
+def decode_path(path_dict):
+    if "corners" in path_dict:
+        corners = np.array(path_dict["corners"], dtype=np.int16).reshape(-1, 2)
+        corners.flags.writeable = False
+    else:
+        corners = path_corners(path_dict["path_nodes"])
+    return {"corners": corners, "length": path_dict["length"], "path_id": path_dict["path_id"]}
+
+
+# One candidate layout for a schematic: where the components go, the paths routed for them and
+# their score. placement is an int16 array of shape (components, 2, 2) with the padded pcb_position
+# of every component in the order of Schematic.components (like sample_layouts gives), paths is a
+# tuple of read-only paths (see path_corners), and the score is -1 until it's been routed.
+# A Layout can't be changed once it's made (routing one gives back a new one), so the placers,
+# routers, scoring and drawing can pass them around, even between threads, without copying
+# anything. The schematic itself only gets changed when a layout is picked with
+# Schematic.commit_layout, which gets its own copies of the paths.
+class Layout:
+    __slots__ = ("placement", "paths", "score")
+
+    def __init__(self, placement, paths=(), score=-1):
+        placement = np.array(placement, dtype=np.int16)
+        placement.flags.writeable = False
+        object.__setattr__(self, "placement", placement)
+        object.__setattr__(self, "paths", tuple(MappingProxyType(dict(path)) for path in paths))
+        object.__setattr__(self, "score", score)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("A Layout can't be changed")
+
+    # So it can be pickled (to send it to another process) and copied
+    def __reduce__(self):
+        return (Layout, (self.placement, [dict(path) for path in self.paths], self.score))
+
+    # Whether it has paths (the routers give none when they can't route a layout)
+    def is_routed(self):
+        return len(self.paths) > 0
+
+    # The pcb_position of every component as lists (for saving it)
+    def pcb_positions(self):
+        return self.placement.tolist()
+
+
+# This class controls the grid and works out a path between a start and goal node.
+# The grid lives in flat NumPy arrays indexed by i*dims+j, so a "node" is just that index.
+# That way setting up a grid is a few array fills instead of making an object for every
+# grid space (the GridNode pseudo code was from Sebastian Lague on YouTube). (-Jason)
+# One grid is meant to be kept for a whole layout: routed traces get blocked in place and
+# each search just bumps a generation counter instead of clearing the cost arrays.
+class PcbGrid:
+    # The offsets for the neighbors that are up, left, right, and down (in the order A* looks at them)
+    NEIGHBOR_OFFSETS = [[-1, 0], [0, -1], [0, 1], [1, 0]]
+    # The same but with the diagonals too, for an 8-connected grid
+    ALL_NEIGHBOR_OFFSETS = [[-1, -1], [-1, 0], [-1, 1], [0, -1],
+                            [0, 1], [1, -1], [1, 0], [1, 1]]
+
+    # The cost model and heuristic that go with each grid connectivity (connectivity: distance method).
+    # Manhattan is the exact distance when there are no diagonal moves and octile is the one when there are.
+    DISTANCES = {
+        4: "manhattan_distance",
+        8: "octile_distance"
+    }
 
-    # Return the f_cost: total cost of the path so far + cost of straight line distance to end
-    def f_cost(self):
-        return self.g_cost + self.h_cost
+    # The routing engines that can be picked by name (name: method that does the search)
+    ROUTING_ENGINES = {
+        "a_star": "a_star",
+        "lee": "lee_wavefront",
+        "jps": "jump_point_search",
+        "bidirectional": "bidirectional_a_star"
+    }
 
-# This class controls the grid nodes and works out a path between a start and goal node
-class PcbGrid:
-    def __init__(self, dims, obstructions):
+    # connectivity is 4 (left, right, up, and down) or 8 (diagonals too) and the heuristic is
+    # multiplied by heuristic_weight. A weight above 1 is weighted A*: it expands fewer nodes
+    # but the path can be up to heuristic_weight times longer than the shortest one.
+    # If a RouteCache is given, route looks there before searching.
+    def __init__(self, dims, obstructions, connectivity=4, heuristic_weight=1, route_cache=None):
+        if not connectivity in self.DISTANCES:
+            raise ValueError("Invalid grid connectivity")
+        if heuristic_weight < 1:
+            raise ValueError("Invalid heuristic weight")
         self.dims = dims
         self.obstructions = obstructions
-        self.nodes = self.initialize_grid(obstructions)
-
-    # This initializes all of the grid spaces
-    # each grid space is a GridNode
-    # I set the taken to be true wherever there are obstructions, of course, and vice versa. (-Jason)
-
+        self.connectivity = connectivity
+        self.heuristic_weight = heuristic_weight
+        self.route_cache = route_cache
+        self.initialize_grid(obstructions)
+
+    # This initializes all of the grid spaces.
+    # taken counts how many obstructions are sitting on a grid space (so a pin that is also the end
+    # of a trace stays blocked when only one of them is unblocked), and the costs and parents
+    # start out at -1 (not looked at yet).
+    # obstructions can be a list of positions or an occupancy bitmap (a dims x dims array of how
+    # many things are on each grid space, like Schematic.pcb_occupancy gives).
+    # A node's costs, parent and open_order only mean something if its opened_generation matches
+    # the current generation, and it is closed if its closed_generation does. The *_back arrays are
+    # the same thing for the search going backwards from the goal in bidirectional_a_star.
+    # n_searches and n_expanded count the searches done on this grid and the nodes they expanded.
+    # congestion is None unless negotiated routing is going on, then it's how much more than
+    # normal each node costs to step on (see Schematic.run_negotiated).
     def initialize_grid(self, obstructions):
-        nodes = {}
-
-        for i in range(0, self.dims):
-            for j in range(0, self.dims):
-                pos = [i, j]
-                if not (pos in obstructions):
-                    nodes[str(pos)] = GridNode(pos, False)
-                else:
-                    nodes[str(pos)] = GridNode(pos, True)
+        n_nodes = self.dims*self.dims
+        if isinstance(obstructions, np.ndarray):
+            self.taken = obstructions.reshape(n_nodes).astype(np.int32)
+        else:
+            self.taken = np.zeros(n_nodes, dtype=np.int32)
+        self.g_cost = np.full(n_nodes, -1, dtype=np.float64)
+        self.h_cost = np.full(n_nodes, -1, dtype=np.float64)
+        self.parent = np.full(n_nodes, -1, dtype=np.int64)
+        self.open_order = np.zeros(n_nodes, dtype=np.int64)
+        self.opened_generation = np.zeros(n_nodes, dtype=np.int64)
+        self.closed_generation = np.zeros(n_nodes, dtype=np.int64)
+        self.g_cost_back = np.full(n_nodes, -1, dtype=np.float64)
+        self.h_cost_back = np.full(n_nodes, -1, dtype=np.float64)
+        self.parent_back = np.full(n_nodes, -1, dtype=np.int64)
+        self.open_order_back = np.zeros(n_nodes, dtype=np.int64)
+        self.opened_generation_back = np.zeros(n_nodes, dtype=np.int64)
+        self.closed_generation_back = np.zeros(n_nodes, dtype=np.int64)
+        self.generation = 0
+        self.n_searches = 0
+        self.n_expanded = 0
+        self.congestion = None
+
+        if not isinstance(obstructions, np.ndarray):
+            for pos in obstructions:
+                node = self.node_at(pos)
+                if node != None:
+                    self.taken[node] += 1
+
+    # Start a fresh search. Bumping the generation makes every node look unopened and
+    # unclosed without touching the arrays.
+    def reset_search(self):
+        self.generation += 1
+        self.n_searches += 1
+
+    # The searches done on this grid so far and the nodes they expanded, as routing_stats
+    # (see Schematic.reset_routing_stats)
+    def routing_stats(self):
+        return {"searches": self.n_searches, "expanded_nodes": self.n_expanded}
+
+    # Put an obstruction (a pin or a trace) on a node
+    def block(self, node):
+        self.taken[node] += 1
+
+    # Take an obstruction back off a node, e.g. to let a trace start or end at a pin
+    def unblock(self, node):
+        if self.taken[node] < 1:
+            raise ValueError("Node is not blocked")
+        self.taken[node] -= 1
+
+    # Block every node on a path (a list of positions)
+    def block_path(self, path_nodes):
+        for pos in path_nodes:
+            self.block(self.node_at(pos))
+
+    # For getting the node (flat index) at a position
+    def node_at(self, pos):
+        if pos[0] >= 0 and pos[0] < self.dims and pos[1] >= 0 and pos[1] < self.dims:
+            return pos[0]*self.dims + pos[1]
 
-        return nodes
+    # For getting the position of a node
+    def pos_at(self, node):
+        return [int(node // self.dims), int(node % self.dims)]
 
-    # For getting a node at a position
-    def node_at(self, pos):
-        if str(pos) in self.nodes.keys():
-            return self.nodes[str(pos)]
+    # Return the f_cost: total cost of the path so far + cost of straight line distance to end
+    def f_cost(self, node):
+        return self.g_cost[node] + self.h_cost[node]
 
-    # Finds the neighbors that are left, right, up, and down
+    # Finds the neighbors that are left, right, up, and down (and the diagonals on an 8-connected grid).
+    # A diagonal is only a neighbor if both spaces it cuts between are free, otherwise its trace
+    # would cross whatever is on them.
     def get_neighbors(self, node):
         neighbors = []
-
-        for i in range(-1, 2):
-            for j in range(-1, 2):
-                if (i == 0 and j == 0) or (i*j != 0):
+        node_i, node_j = divmod(node, self.dims)
+        offsets = self.NEIGHBOR_OFFSETS if self.connectivity == 4 else self.ALL_NEIGHBOR_OFFSETS
+
+        for i, j in offsets:
+            neighbor_i = node_i + i
+            neighbor_j = node_j + j
+            if neighbor_i >= 0 and neighbor_i < self.dims and neighbor_j >= 0 and neighbor_j < self.dims:
+                if i*j != 0 and (self.taken[node_i*self.dims + neighbor_j] or self.taken[neighbor_i*self.dims + node_j]):
                     continue
-                neighbor_node_pos = [node.pos[0] + i, node.pos[1] + j]
-                if neighbor_node_pos[0] >= 0 and neighbor_node_pos[0] < self.dims and neighbor_node_pos[1] >= 0 and neighbor_node_pos[1] < self.dims:
-                    neighbor_node = self.nodes[str(neighbor_node_pos)]
-                    neighbors.append(neighbor_node)
+                neighbors.append(neighbor_i*self.dims + neighbor_j)
 
         return neighbors
 
+    # The distance with only left, right, up, and down moves (10 per step)
+    def manhattan_distance(self, from_node, goal_node):
+        di = abs(goal_node[0] - from_node[0])
+        dj = abs(goal_node[1] - from_node[1])
+        return 10 * (di + dj)
+
     # The heuristic from Sebastian Lague (i is for rows (y), j is for columns (x))
-    def get_distance(self, from_node, goal_node):
+    # The distance when diagonal moves (14 per step) are allowed too
+    def octile_distance(self, from_node, goal_node):
         di = abs(goal_node[0] - from_node[0])
         dj = abs(goal_node[1] - from_node[1])
 
@@ -439,6 +732,22 @@ class PcbGrid:
             return 14 * di + 10 * (dj - di)
         return 14 * dj + 10 * (di - dj)
 
+    # The cost of going between two positions, using the distance for this grid's connectivity.
+    # This is the g_cost of a step between neighbors.
+    def get_distance(self, from_node, goal_node):
+        return getattr(self, self.DISTANCES[self.connectivity])(from_node, goal_node)
+
+    # The g_cost of stepping from one position onto a neighboring node: the distance, times
+    # the node's congestion when there is any
+    def get_step_cost(self, from_node, to_node, node):
+        if self.congestion is None:
+            return self.get_distance(from_node, to_node)
+        return self.get_distance(from_node, to_node) * self.congestion[node]
+
+    # The h_cost: the distance to the goal, times the heuristic weight
+    def get_heuristic(self, from_node, goal_node):
+        return self.heuristic_weight * self.get_distance(from_node, goal_node)
+
     # This gets the path nodes' positions by looking at the goal node and tracing
     # its "parents" to the start node and then the resulting list is reversed to put it
     # the right way around.
@@ -447,32 +756,65 @@ class PcbGrid:
         node = goal_node
 
         while node != start_node:
-            # print(node.pos, node.parent)
-            lst.append(node.pos)
-            node = node.parent
+            lst.append(self.pos_at(node))
+            node = int(self.parent[node])
         else:
-            lst.append(start_node.pos)
+            lst.append(self.pos_at(start_node))
+
+        lst.reverse()
+        return lst
+
+    # The same, but for after a_star_from: it traces back to whichever start node the path came from
+    def retrace_path_from_any(self, goal_node):
+        lst = []
+        node = goal_node
+
+        while node >= 0:
+            lst.append(self.pos_at(node))
+            node = int(self.parent[node])
 
         lst.reverse()
         return lst
 
     # A* as defined by Sebastian Lague (-Jason)
+    # The open set is a binary heap and the membership checks are array lookups, so each
+    # expansion is O(log n) instead of a scan over every open and closed node.
     def a_star(self, start_node, goal_node):
-        # Two sets: one for the things we need to deal with, and the oher for things we are done dealing with
-        open_nodes = [self.nodes[str(start_node.pos)]]
-        closed_nodes = []
+        return self.a_star_from([start_node], goal_node)
+
+    # A* that can start from any of several start nodes (e.g. every grid space already on a net's
+    # traces) and finds the shortest path from whichever one is best. Every start node gets no parent.
+    def a_star_from(self, start_nodes, goal_node):
+        # Two sets: one for the things we need to deal with, and the oher for things we are done dealing with.
+        # Heap entries are (f_cost, h_cost, open_order, node). open_order is when the node was first
+        # opened, so ties on f_cost and h_cost go to the earliest opened node like the old list scan did.
+        self.reset_search()
+        generation = self.generation
+        open_heap = []
+        for start_node in start_nodes:
+            self.g_cost[start_node] = -1
+            self.h_cost[start_node] = -1
+            self.parent[start_node] = -1
+            self.open_order[start_node] = len(open_heap)
+            self.opened_generation[start_node] = generation
+            open_heap.append((self.f_cost(start_node), self.h_cost[start_node],
+                              len(open_heap), start_node))
+        n_opened = len(open_heap)
+        goal_pos = self.pos_at(goal_node)
 
         # while there is something to deal with
-        while len(open_nodes) > 0:
+        while len(open_heap) > 0:
             # find node with lowest f_cost to go to
-            this_node = open_nodes[0]
-            for that_node in open_nodes[1:]:
-                if (that_node.f_cost() < this_node.f_cost()) or ((that_node.f_cost() == this_node.f_cost()) and (that_node.h_cost < this_node.h_cost)):
-                    this_node = that_node
+            this_node = heapq.heappop(open_heap)[3]
+
+            # A node whose cost got lowered is pushed again, so skip the stale entry
+            # once the cheaper one has already been dealt with.
+            if self.closed_generation[this_node] == generation:
+                continue
 
-            # place node in closed list (we're dealing with it now, so we don't need it in the "need to deal with" list)
-            open_nodes.remove(this_node)
-            closed_nodes.append(this_node)
+            # place node in closed set (we're dealing with it now, so we don't need it in the "need to deal with" set)
+            self.closed_generation[this_node] = generation
+            self.n_expanded += 1
 
             # If the node happens to be the goal node,
             # return false to alert the caller that the paths list is definitely not empty
@@ -480,24 +822,345 @@ class PcbGrid:
                 return False
 
             # Look at all the neighbors and decide which ones to deal with.
+            this_pos = self.pos_at(this_node)
             for neighbor in self.get_neighbors(this_node):
-                if neighbor.taken or (neighbor in closed_nodes):
+                if self.taken[neighbor] or self.closed_generation[neighbor] == generation:
                     continue
 
-                tentative_g_cost = this_node.g_cost + \
-                    self.get_distance(this_node.pos, neighbor.pos)
-                if (tentative_g_cost < neighbor.g_cost) or not (neighbor in open_nodes):
-                    neighbor.g_cost = tentative_g_cost
-                    neighbor.h_cost = self.get_distance(
-                        neighbor.pos, goal_node.pos)
-                    neighbor.parent = this_node
-
-                    if not(neighbor in open_nodes):
-                        open_nodes.append(neighbor)
+                neighbor_pos = self.pos_at(neighbor)
+                tentative_g_cost = self.g_cost[this_node] + \
+                    self.get_step_cost(this_pos, neighbor_pos, neighbor)
+                opened = self.opened_generation[neighbor] == generation
+                if not opened or (tentative_g_cost < self.g_cost[neighbor]):
+                    self.g_cost[neighbor] = tentative_g_cost
+                    self.h_cost[neighbor] = self.get_heuristic(
+                        neighbor_pos, goal_pos)
+                    self.parent[neighbor] = this_node
+
+                    if not opened:
+                        self.opened_generation[neighbor] = generation
+                        self.open_order[neighbor] = n_opened
+                        n_opened += 1
+                    heapq.heappush(open_heap, (self.f_cost(neighbor), self.h_cost[neighbor],
+                                               self.open_order[neighbor], neighbor))
         # let the caller know that the paths list is empty - there wasn't a path
-        if self.nodes[str(goal_node.pos)].parent == None:
+        return True
+
+    # Lee's maze router. Instead of expanding one node at a time, the whole wavefront moves out
+    # one grid space per step using shifted copies of the grid, so the loop runs once per step of
+    # distance instead of once per node. On a 4-connected grid where every step costs the same
+    # this gives a shortest path just like A*. The path is then walked back from the goal through
+    # the distance field and parent/g_cost are filled in along it so retrace_path works the same.
+    # Returns True if there wasn't a path (same as a_star).
+    def lee_wavefront(self, start_node, goal_node):
+        if self.connectivity != 4:
+            raise ValueError("Lee's router only works on a 4-connected grid")
+        self.reset_search()
+        free = (self.taken == 0).reshape(self.dims, self.dims)
+        distance = np.full((self.dims, self.dims), -1, dtype=np.int64)
+        start_i, start_j = self.pos_at(start_node)
+        goal_i, goal_j = self.pos_at(goal_node)
+        distance[start_i, start_j] = 0
+
+        wavefront = np.zeros((self.dims, self.dims), dtype=bool)
+        wavefront[start_i, start_j] = True
+        self.n_expanded += 1
+        step = 0
+        while distance[goal_i, goal_j] < 0:
+            # Move the wavefront down, up, right, and left by one space
+            next_wavefront = np.zeros((self.dims, self.dims), dtype=bool)
+            next_wavefront[1:, :] |= wavefront[:-1, :]
+            next_wavefront[:-1, :] |= wavefront[1:, :]
+            next_wavefront[:, 1:] |= wavefront[:, :-1]
+            next_wavefront[:, :-1] |= wavefront[:, 1:]
+            # Only keep the free spaces that haven't been reached yet
+            next_wavefront &= free & (distance < 0)
+
+            # The wave died out before it got to the goal
+            if not next_wavefront.any():
+                return True
+
+            step += 1
+            distance[next_wavefront] = step
+            self.n_expanded += int(np.count_nonzero(next_wavefront))
+            wavefront = next_wavefront
+
+        # Walk back downhill from the goal to the start, going straight when possible so the
+        # traces have fewer corners.
+        path = [[goal_i, goal_j]]
+        direction = None
+        while step > 0:
+            i, j = path[-1]
+            step -= 1
+            offsets = self.NEIGHBOR_OFFSETS if direction == None else [
+                direction] + self.NEIGHBOR_OFFSETS
+            for di, dj in offsets:
+                prev_i = i + di
+                prev_j = j + dj
+                if prev_i >= 0 and prev_i < self.dims and prev_j >= 0 and prev_j < self.dims and distance[prev_i, prev_j] == step:
+                    path.append([prev_i, prev_j])
+                    direction = [di, dj]
+                    break
+        path.reverse()
+
+        self.set_path_costs(path)
+        return False
+
+    # Fills in the parents and g_costs along a path (a list of positions) like A* would have,
+    # with the start node's g_cost at -1.
+    def set_path_costs(self, path):
+        self.g_cost[self.node_at(path[0])] = -1
+        for prev_pos, pos in zip(path[:-1], path[1:]):
+            node = self.node_at(pos)
+            prev_node = self.node_at(prev_pos)
+            self.g_cost[node] = self.g_cost[prev_node] + \
+                self.get_distance(prev_pos, pos)
+            self.parent[node] = prev_node
+
+    # True if the position is on the grid and nothing is sitting on it
+    def is_free(self, i, j):
+        return i >= 0 and i < self.dims and j >= 0 and j < self.dims and not self.taken[i*self.dims + j]
+
+    # For JPS: keep going in a straight line in the direction (di, dj) from (i, j) until
+    # reaching a jump point (the goal, or a space with a "forced" neighbor that only a path
+    # turning here could get to cheapest). Returns None if a wall or obstruction is hit first.
+    # Moving vertically also looks sideways at every step since a horizontal jump point
+    # there means a turn has to happen here. (4-connected rules as in PathFinding.js)
+    def jump(self, i, j, di, dj, goal_pos):
+        while True:
+            i += di
+            j += dj
+            if not self.is_free(i, j):
+                return None
+            if i == goal_pos[0] and j == goal_pos[1]:
+                return [i, j]
+
+            # moving along j (horizontally)
+            if dj != 0:
+                if (self.is_free(i - 1, j) and not self.is_free(i - 1, j - dj)) or \
+                        (self.is_free(i + 1, j) and not self.is_free(i + 1, j - dj)):
+                    return [i, j]
+            # moving along i (vertically)
+            else:
+                if (self.is_free(i, j - 1) and not self.is_free(i - di, j - 1)) or \
+                        (self.is_free(i, j + 1) and not self.is_free(i - di, j + 1)):
+                    return [i, j]
+                if self.jump(i, j, 0, 1, goal_pos) != None or self.jump(i, j, 0, -1, goal_pos) != None:
+                    return [i, j]
+
+    # Jump Point Search: A* that, on a grid where every step costs the same, skips over all of the
+    # in-between nodes of straight runs that other paths could reach just as cheaply and only
+    # opens the jump points. Once the goal is found the straight runs between jump points are
+    # filled back in, so retrace_path still gives every grid space on the path.
+    # Returns True if there wasn't a path (same as a_star).
+    def jump_point_search(self, start_node, goal_node):
+        if self.connectivity != 4:
+            raise ValueError("Jump point search only works on a 4-connected grid")
+        self.reset_search()
+        generation = self.generation
+        self.g_cost[start_node] = -1
+        self.h_cost[start_node] = -1
+        self.open_order[start_node] = 0
+        self.opened_generation[start_node] = generation
+        n_opened = 1
+        open_heap = [(self.f_cost(start_node), self.h_cost[start_node], 0, start_node)]
+        goal_pos = self.pos_at(goal_node)
+
+        while len(open_heap) > 0:
+            this_node = heapq.heappop(open_heap)[3]
+            if self.closed_generation[this_node] == generation:
+                continue
+            self.closed_generation[this_node] = generation
+            self.n_expanded += 1
+
+            if this_node == goal_node:
+                self.fill_in_jumps(start_node, goal_node)
+                return False
+
+            # The start looks in every direction. Everything else only keeps going the way
+            # it came or turns to either side (going back can't be any better).
+            this_pos = self.pos_at(this_node)
+            if this_node == start_node:
+                directions = self.NEIGHBOR_OFFSETS
+            else:
+                parent_pos = self.pos_at(self.parent[this_node])
+                di = int(np.sign(this_pos[0] - parent_pos[0]))
+                dj = int(np.sign(this_pos[1] - parent_pos[1]))
+                if dj != 0:
+                    directions = [[-1, 0], [1, 0], [0, dj]]
+                else:
+                    directions = [[0, -1], [0, 1], [di, 0]]
+
+            for di, dj in directions:
+                jump_pos = self.jump(this_pos[0], this_pos[1], di, dj, goal_pos)
+                if jump_pos == None:
+                    continue
+                jump_node = self.node_at(jump_pos)
+                if self.closed_generation[jump_node] == generation:
+                    continue
+
+                tentative_g_cost = self.g_cost[this_node] + \
+                    self.get_distance(this_pos, jump_pos)
+                opened = self.opened_generation[jump_node] == generation
+                if not opened or (tentative_g_cost < self.g_cost[jump_node]):
+                    self.g_cost[jump_node] = tentative_g_cost
+                    self.h_cost[jump_node] = self.get_heuristic(
+                        jump_pos, goal_pos)
+                    self.parent[jump_node] = this_node
+
+                    if not opened:
+                        self.opened_generation[jump_node] = generation
+                        self.open_order[jump_node] = n_opened
+                        n_opened += 1
+                    heapq.heappush(open_heap, (self.f_cost(jump_node), self.h_cost[jump_node],
+                                               self.open_order[jump_node], jump_node))
+        return True
+
+    # After JPS, the parents only link jump points. This walks back from the goal and gives
+    # every grid space on the straight runs between them a parent and a g_cost.
+    def fill_in_jumps(self, start_node, goal_node):
+        node = goal_node
+        while node != start_node:
+            jump_parent = int(self.parent[node])
+            from_pos = self.pos_at(jump_parent)
+            to_pos = self.pos_at(node)
+            di = int(np.sign(to_pos[0] - from_pos[0]))
+            dj = int(np.sign(to_pos[1] - from_pos[1]))
+
+            prev_node = jump_parent
+            pos = from_pos
+            while pos != to_pos:
+                next_pos = [pos[0] + di, pos[1] + dj]
+                next_node = self.node_at(next_pos)
+                self.parent[next_node] = prev_node
+                self.g_cost[next_node] = self.g_cost[prev_node] + \
+                    self.get_distance(pos, next_pos)
+                prev_node = next_node
+                pos = next_pos
+            node = jump_parent
+
+    # Bidirectional A*: one search grows from the start toward the goal and another from the goal
+    # toward the start, and whichever has the smaller open set goes next. Whenever one of them
+    # reaches a node the other has opened, that's a possible path. Once neither open set can
+    # beat the best one found, the two halves are joined into the normal parent chain.
+    # Returns True if there wasn't a path (same as a_star).
+    def bidirectional_a_star(self, start_node, goal_node):
+        # a_star can never step onto a taken goal, so neither can this
+        if self.taken[goal_node]:
+            return True
+
+        self.reset_search()
+        generation = self.generation
+        # Side 0 is the search from the start, side 1 is the search from the goal
+        g_costs = [self.g_cost, self.g_cost_back]
+        h_costs = [self.h_cost, self.h_cost_back]
+        parents = [self.parent, self.parent_back]
+        open_orders = [self.open_order, self.open_order_back]
+        opened_generations = [self.opened_generation, self.opened_generation_back]
+        closed_generations = [self.closed_generation, self.closed_generation_back]
+        targets = [self.pos_at(goal_node), self.pos_at(start_node)]
+        open_heaps = [[], []]
+        n_opened = [1, 1]
+
+        for side, root in enumerate([start_node, goal_node]):
+            g_costs[side][root] = 0
+            h_costs[side][root] = self.get_heuristic(
+                self.pos_at(root), targets[side])
+            open_orders[side][root] = 0
+            opened_generations[side][root] = generation
+            open_heaps[side].append(
+                (g_costs[side][root] + h_costs[side][root], h_costs[side][root], 0, root))
+
+        # best_cost is the cheapest start to goal path found so far and meeting is the
+        # [node on the start side, node on the goal side] pair it goes through
+        best_cost = None
+        meeting = None
+
+        while len(open_heaps[0]) > 0 and len(open_heaps[1]) > 0:
+            if best_cost != None and (open_heaps[0][0][0] >= best_cost or open_heaps[1][0][0] >= best_cost):
+                break
+
+            side = 0 if len(open_heaps[0]) <= len(open_heaps[1]) else 1
+            other = 1 - side
+            this_node = heapq.heappop(open_heaps[side])[3]
+            if closed_generations[side][this_node] == generation:
+                continue
+            closed_generations[side][this_node] = generation
+            self.n_expanded += 1
+
+            this_pos = self.pos_at(this_node)
+            for neighbor in self.get_neighbors(this_node):
+                # The start pin may still be counted as taken, but a_star never checks it either
+                if (self.taken[neighbor] and neighbor != start_node) or closed_generations[side][neighbor] == generation:
+                    continue
+
+                neighbor_pos = self.pos_at(neighbor)
+                tentative_g_cost = g_costs[side][this_node] + \
+                    self.get_distance(this_pos, neighbor_pos)
+                opened = opened_generations[side][neighbor] == generation
+                if not opened or (tentative_g_cost < g_costs[side][neighbor]):
+                    g_costs[side][neighbor] = tentative_g_cost
+                    h_costs[side][neighbor] = self.get_heuristic(
+                        neighbor_pos, targets[side])
+                    parents[side][neighbor] = this_node
+
+                    if not opened:
+                        opened_generations[side][neighbor] = generation
+                        open_orders[side][neighbor] = n_opened[side]
+                        n_opened[side] += 1
+                    heapq.heappush(open_heaps[side], (g_costs[side][neighbor] + h_costs[side][neighbor],
+                                                      h_costs[side][neighbor], open_orders[side][neighbor], neighbor))
+
+                # See if this links up with the other search
+                if opened_generations[other][neighbor] == generation:
+                    cost = tentative_g_cost + g_costs[other][neighbor]
+                    if best_cost == None or cost < best_cost:
+                        best_cost = cost
+                        meeting = [this_node, neighbor] if side == 0 else [
+                            neighbor, this_node]
+
+        if meeting == None:
             return True
 
+        # Hang the goal side's chain off of the start side's chain
+        prev_node, node = meeting
+        while True:
+            back_parent = int(self.parent_back[node])
+            self.parent[node] = prev_node
+            if node == goal_node:
+                break
+            prev_node = node
+            node = back_parent
+
+        self.set_path_costs(self.retrace_path(start_node, goal_node))
+        return False
+
+    # Finds a path from the start node to the goal node with whichever routing engine is asked for.
+    # Returns True if there wasn't a path. Routes come out of the route cache when there is one
+    # (not while negotiating, since the congestion costs aren't part of the key).
+    def route(self, start_node, goal_node, engine="a_star"):
+        if not engine in self.ROUTING_ENGINES:
+            raise ValueError(f"Invalid routing engine \"{engine}\"")
+        if self.route_cache is None or self.congestion is not None:
+            return getattr(self, self.ROUTING_ENGINES[engine])(start_node, goal_node)
+
+        key = self.route_cache.make_key(self, start_node, goal_node, engine)
+        corners = self.route_cache.get(key)
+        if corners is not None:
+            if len(corners) == 0:
+                return True
+            self.set_path_costs(path_cells(corners))
+            return False
+
+        no_paths = getattr(self, self.ROUTING_ENGINES[engine])(
+            start_node, goal_node)
+        if no_paths:
+            self.route_cache.put(key, path_corners([]))
+        else:
+            self.route_cache.put(key, path_corners(
+                self.retrace_path(start_node, goal_node)))
+        return no_paths
+
 
 class Schematic:
     COMPONENT_CLASSES = {
@@ -510,6 +1173,22 @@ class Schematic:
         "VoltageSource": VoltageSource
     }
 
+    # The ways a layout can be routed (name: method that routes it). They all return the paths (or []),
+    # the connection that couldn't be routed (or None) and the routing_stats of their searches.
+    ROUTERS = {
+        "sequential": "route_connections",
+        "negotiated": "run_negotiated",
+        "net_trees": "run_net_trees"
+    }
+
+    # The orders the connections list gets tried in before falling back on random ones
+    # (name: method that sorts the connections list). They're tried in this order.
+    ORDERING_STRATEGIES = {
+        "shortest_first": "order_shortest_first",
+        "most_constrained_first": "order_most_constrained_first",
+        "least_overlap_first": "order_least_overlap_first"
+    }
+
     def __init__(self):
         self.components = {}
         self.comments = {}
@@ -517,9 +1196,21 @@ class Schematic:
         self.curr_runs_score = -1
         self.pin_placement_dict = {}
         self.connections_list = []
+        # How many searches the router has done and how many nodes they expanded, and how many
+        # layouts were pruned or aborted (since the last monte_carlo, see reset_routing_stats)
+        self.reset_routing_stats()
+        # Routes that have already been found (see RouteCache)
+        self.route_cache = RouteCache()
+        # Finished layouts on disk for monte_carlo to reuse (see LayoutCache), None to not use one
+        self.layout_cache = None
+        # The best placements for every circuit topology (a LayoutCache keyed on topology_key), None to not use one
+        self.placement_library = None
+        # The random number generator for sample_layouts and random connection orders
+        self.rng = np.random.default_rng()
         self.area_weight = .3
         self.path_length_weight = .7
         self.set_monte_carlo_parameters()
+        self.set_routing_parameters()
         self.converted_image_bg_color = (0, 0, 0)
         self.converted_image_color_mode = "RGB"
         self.converted_image_scaling = 50
@@ -532,6 +1223,12 @@ class Schematic:
         self.a_star_grid_padding = a_star_grid_padding
         self.target_score = target_score
 
+    # Allows for setting how the router moves: connectivity is 4 (no diagonal traces) or 8, and
+    # a heuristic_weight above 1 trades the shortest traces for faster routing (see PcbGrid)
+    def set_routing_parameters(self, connectivity=4, heuristic_weight=1):
+        self.routing_connectivity = connectivity
+        self.heuristic_weight = heuristic_weight
+
     # Checks an id versus the list of component ids that exist and tells whether its unique (-Jason)
     def unique_component_id(self, id):
         if len(self.components) < 1:
@@ -555,6 +1252,8 @@ class Schematic:
             self.add_comment(comment)
 
         self.paths = schematic_dict["paths"]
+        if self.paths != None:
+            self.paths = [decode_path(path) for path in self.paths]
         self.curr_runs_score = schematic_dict["curr_runs_score"]
         self.pin_placement_dict = schematic_dict["pin_placement_dict"]
         self.connections_list = schematic_dict["connections_list"]
@@ -688,7 +1387,7 @@ class Schematic:
         schematic_dict = {
             "components": components,
             "comments": comments,
-            "paths": self.paths,
+            "paths": None if self.paths == None else [encode_path(path) for path in self.paths],
             "curr_runs_score": self.curr_runs_score,
             "target_score": self.target_score,
             "pin_placement_dict": self.pin_placement_dict,
@@ -751,6 +1450,29 @@ class Schematic:
 
         return not_allowed
 
+    # The same thing as an occupancy bitmap for the (padded) pcb grid: how many pins are on each space.
+    # With pin_positions (see pin_placement) it's for those pins instead of where the components are.
+    def pcb_occupancy(self, pin_positions=None):
+        dims = self.n_grid_spaces + self.a_star_grid_padding
+        occupancy = np.zeros((dims, dims), dtype=np.int32)
+
+        if pin_positions == None:
+            positions = [pos for component in self.components.values()
+                         for pos in component.pcb_position]
+        else:
+            positions = pin_positions.values()
+        self.add_to_occupancy(occupancy, positions)
+
+        return occupancy
+
+    # Puts pins at positions (on the padded pcb grid) on an occupancy bitmap from pcb_occupancy.
+    # Pins that are off the grid are left out.
+    def add_to_occupancy(self, occupancy, positions):
+        dims = occupancy.shape[0]
+        for pos in positions:
+            if pos[0] >= 0 and pos[0] < dims and pos[1] >= 0 and pos[1] < dims:
+                occupancy[pos[0], pos[1]] += 1
+
     # Randomly pick one pin position
     def get_pin1_pos(self):
         pin1_pos = [int(np.floor(np.random.rand() * self.n_grid_spaces)),
@@ -803,30 +1525,107 @@ class Schematic:
 
         return pin2_pos
 
-    # Figure out a position for the pins without landing on a "not_allowed" spot
-    def get_valid_spot(self, not_allowed_pcb_spots):
+    # Figure out a position for the pins without landing on an occupied spot
+    # (occupancy is a bitmap from pcb_occupancy), adjusted by the padding
+    def get_valid_spot(self, occupancy):
+        padding = int(self.a_star_grid_padding/2)
         rn_pos_1 = self.get_pin1_pos()
         rn_pos_2 = self.get_pin2_pos(rn_pos_1)
-        rn_pos = [rn_pos_1, rn_pos_2]
+        rn_pos = np.add([rn_pos_1, rn_pos_2], padding).tolist()
 
         i = 0
-        while rn_pos[0] in not_allowed_pcb_spots or rn_pos[1] in not_allowed_pcb_spots:
+        while occupancy[rn_pos[0][0], rn_pos[0][1]] or occupancy[rn_pos[1][0], rn_pos[1][1]]:
             rn_pos_1 = self.get_pin1_pos()
             rn_pos_2 = self.get_pin2_pos(rn_pos_1)
-            rn_pos = [rn_pos_1, rn_pos_2]
+            rn_pos = np.add([rn_pos_1, rn_pos_2], padding).tolist()
 
             i += 1
         return rn_pos
 
     # Will make a layout where no pins overlap
     # and are adjusted by some padding (-Jason)
+    # The spots that are taken are kept in the same bitmap pcb_occupancy gives, filled in as
+    # each component is placed.
     def randomize_layout(self):
+        occupancy = self.pcb_occupancy({})
         for component in self.components:
-            rn_spot = self.get_valid_spot(self.not_allowed_pcb_spots())
+            rn_spot = self.get_valid_spot(occupancy)
+            self.add_to_occupancy(occupancy, rn_spot)
             self.components[component].set_pcb_pos(rn_spot)
-        for component in self.components:
-            self.components[component].set_pcb_pos(np.add(
-                self.components[component].pcb_position, [int(self.a_star_grid_padding/2), int(self.a_star_grid_padding/2)]).tolist())
+
+    # Every legal way to put a component on the (unpadded) grid: an array of [pin 1 space, pin 2 space]
+    # pairs, where a space is i*n_grid_spaces+j and pin 2 is next to pin 1 in one of the PCB_ORIENTATIONS.
+    def placement_table(self):
+        n = self.n_grid_spaces
+        pin_1_i, pin_1_j = np.divmod(np.arange(n*n), n)
+        table = []
+        for di, dj in PCB_ORIENTATIONS:
+            pin_2_i = pin_1_i + di
+            pin_2_j = pin_1_j + dj
+            on_grid = (pin_2_i >= 0) & (pin_2_i < n) & (
+                pin_2_j >= 0) & (pin_2_j < n)
+            table.append(np.stack([pin_1_i*n + pin_1_j, pin_2_i*n + pin_2_j], axis=1)[on_grid])
+        return np.concatenate(table)
+
+    # Makes n_layouts random layouts at once, like randomize_layout does one at a time. Components are
+    # placed one after another, but for every layout at the same time: each layout picks a spot out of
+    # the placement_table, and only the layouts where it landed on something pick again. A layout that
+    # still can't fit a component after max_tries picks gets dropped, so fewer than n_layouts can come back.
+    # Returns an array of shape (layouts, components, 2, 2): the padded pcb_position of every component
+    # (in the order of self.components) for each layout.
+    def sample_layouts(self, n_layouts, rng=None, max_tries=100):
+        if rng == None:
+            rng = self.rng
+        n = self.n_grid_spaces
+        n_components = len(self.components)
+        if 2*n_components > n*n:
+            raise ValueError("Too many components for the grid")
+
+        table = self.placement_table()
+        occupied = np.zeros((n_layouts, n*n), dtype=bool)
+        placements = np.zeros((n_layouts, n_components), dtype=np.int64)
+        valid = np.ones(n_layouts, dtype=bool)
+
+        for c in range(0, n_components):
+            to_place = np.flatnonzero(valid)
+            tries = 0
+            while len(to_place) > 0 and tries < max_tries:
+                picks = rng.integers(0, len(table), size=len(to_place))
+                spaces = table[picks]
+                landed_on_something = occupied[to_place, spaces[:, 0]] | \
+                    occupied[to_place, spaces[:, 1]]
+
+                placed = to_place[~landed_on_something]
+                placements[placed, c] = picks[~landed_on_something]
+                occupied[placed, spaces[~landed_on_something, 0]] = True
+                occupied[placed, spaces[~landed_on_something, 1]] = True
+
+                to_place = to_place[landed_on_something]
+                tries += 1
+            valid[to_place] = False
+
+        spaces = table[placements[valid]]
+        positions = np.stack(np.divmod(spaces, n), axis=-1)
+        return positions + int(self.a_star_grid_padding/2)
+
+    # Whether a placement (see Layout) fits the grid as it's set up now: every pin is on the board
+    # (inside the padding) and no two pins are on the same space
+    def placement_fits(self, placement):
+        positions = np.asarray(placement).reshape(-1, 2) - int(self.a_star_grid_padding/2)
+        if len(positions) != 2*len(self.components):
+            return False
+        if ((positions < 0) | (positions >= self.n_grid_spaces)).any():
+            return False
+        return len(np.unique(positions, axis=0)) == len(positions)
+
+    # Where every pin goes for a placement (see Layout), without moving the components.
+    # This is what the routers go by instead of pin_placement_dict.
+    def pin_placement(self, placement):
+        pin_positions = {}
+        for component, pcb_position in zip(self.components.values(), np.asarray(placement).tolist()):
+            for pin_id, pos in zip(component.connections.keys(), pcb_position):
+                pin_positions[pin_id] = pos
+        return pin_positions
 
     # This gets a list for the position for every pin
     def initialize_pin_placement_dict(self):
@@ -850,53 +1649,715 @@ class Schematic:
                         connections_list.append([pin_id, connection])
         self.connections_list = connections_list
 
-    # LOOK AT force base graph layout algorithms as an alternative to this (-Jason)
+    # The Manhattan distance (in grid spaces) between the two pins of a connection
+    # (pin_positions is where the pins are, see pin_placement)
+    def connection_distance(self, connection, pin_positions):
+        pos_1 = pin_positions[connection[0]]
+        pos_2 = pin_positions[connection[1]]
+        return abs(pos_1[0] - pos_2[0]) + abs(pos_1[1] - pos_2[1])
+
+    # Short connections first: they have the fewest ways to go and get in the way the least
+    def order_shortest_first(self, pin_positions):
+        return sorted(self.connections_list, key=lambda connection: self.connection_distance(connection, pin_positions))
+
+    # Connections with a pin that's boxed in (by the board edge or other pins) first, since
+    # they're the easiest to cut off. Ties go to the shorter connection.
+    def order_most_constrained_first(self, pin_positions):
+        dims = self.n_grid_spaces + self.a_star_grid_padding
+        occupancy = self.pcb_occupancy(pin_positions)
+
+        def free_sides(pin_id):
+            pos = pin_positions[pin_id]
+            n_free = 0
+            for offset in PCB_ORIENTATIONS:
+                neighbor_pos = np.add(pos, offset).tolist()
+                if neighbor_pos[0] >= 0 and neighbor_pos[0] < dims and neighbor_pos[1] >= 0 and neighbor_pos[1] < dims and not occupancy[neighbor_pos[0], neighbor_pos[1]]:
+                    n_free += 1
+            return n_free
+
+        return sorted(self.connections_list, key=lambda connection: (min(free_sides(connection[0]), free_sides(connection[1])),
+                                                                    self.connection_distance(connection, pin_positions)))
+
+    # Connections whose bounding box has the fewest other pins in it first, since those are the
+    # least likely to wall something in. Ties go to the shorter connection.
+    def order_least_overlap_first(self, pin_positions):
+        def pins_in_bounding_box(connection):
+            pos_1 = pin_positions[connection[0]]
+            pos_2 = pin_positions[connection[1]]
+            n_pins = 0
+            for pin_id, pos in pin_positions.items():
+                if pin_id in connection:
+                    continue
+                if min(pos_1[0], pos_2[0]) <= pos[0] <= max(pos_1[0], pos_2[0]) and min(pos_1[1], pos_2[1]) <= pos[1] <= max(pos_1[1], pos_2[1]):
+                    n_pins += 1
+            return n_pins
+
+        return sorted(self.connections_list, key=lambda connection: (pins_in_bounding_box(connection),
+                                                                    self.connection_distance(connection, pin_positions)))
+
+    # Routes the connections list, trying different orders for it until one works or max_tries
+    # orders have been tried. The ordering strategies go first, then whenever an order fails the
+    # connection that couldn't be routed gets moved to the front for the next try, and random
+    # orders are only used once those run out. No order is routed twice, but a repeat still uses
+    # up one of the max_tries.
+    # pin_positions is where the pins are (see pin_placement) and score_to_beat goes to run_a_star.
+    # An order that can't beat score_to_beat only rules out that order, so it moves on to the next
+    # one, and the layout counts in routing_stats["aborted"] if none of them worked. Random orders
+    # are shuffled with rng (self.rng by default).
+    # Returns the paths ([] if no order worked or there's nothing to route), the connection that
+    # couldn't be routed the last time one failed (or None) and the routing_stats of all the tries.
+    def route_connections(self, pin_positions, engine="a_star", orderings=None, max_tries=None, score_to_beat=None,
+                          rng=None):
+        routing_stats = {"searches": 0, "expanded_nodes": 0, "aborted": 0}
+        if len(self.connections_list) == 0:
+            return [], None, routing_stats
+        if rng == None:
+            rng = self.rng
+        if orderings == None:
+            orderings = list(self.ORDERING_STRATEGIES)
+        if max_tries == None:
+            max_tries = 4*len(self.connections_list) + 1
+        for ordering in orderings:
+            if not ordering in self.ORDERING_STRATEGIES:
+                raise ValueError(f"Invalid ordering strategy \"{ordering}\"")
+
+        to_try = [getattr(self, self.ORDERING_STRATEGIES[ordering])(pin_positions)
+                  for ordering in orderings]
+        tried = set()
+        # Random orders are shuffled from the last order that was tried
+        last_order = self.connections_list
+        # Repeats count as attempts too so this ends even when there are fewer orders than max_tries
+        attempts = 0
+        aborted = False
+        failed_connection = None
+        while attempts < max_tries:
+            attempts += 1
+            if len(to_try) > 0:
+                order = to_try.pop(0)
+            else:
+                order = list(last_order)
+                rng.shuffle(order)
+
+            order_key = tuple(tuple(connection) for connection in order)
+            if order_key in tried:
+                continue
+            tried.add(order_key)
+            last_order = order
+
+            paths, order_failed_connection, order_stats = self.run_a_star(engine, pin_positions, order, score_to_beat)
+            add_routing_stats(routing_stats, order_stats)
+            # This order can't beat score_to_beat, but another one might still route it shorter
+            if paths == None:
+                aborted = True
+                continue
+            if paths != []:
+                return paths, None, routing_stats
+
+            # Give the connection that got blocked first pick next time
+            failed_connection = order_failed_connection
+            rest = list(order)
+            rest.remove(failed_connection)
+            to_try.insert(0, [failed_connection] + rest)
+
+        if aborted:
+            routing_stats["aborted"] += 1
+        return [], failed_connection, routing_stats
+
     # Metropolis' Monte Carlo method. Which means nothing more than
     # lets take a random approach to placing things on a board.
     # Given darts and a dartboard, see what happens (-Jason)
-    def monte_carlo(self, max_iters=1000):
-        paths = []
-        curr_runs_score = 0
+    # router picks how each layout gets routed (see ROUTERS). For the "sequential" router, engine
+    # picks the search that is used (see PcbGrid.ROUTING_ENGINES) and orderings are the
+    # ORDERING_STRATEGIES to try the connections list in (all of them by default). The other
+    # routers only use a_star.
+    # Layouts are drawn batch_size at a time with sample_layouts. Giving a seed reseeds self.rng
+    # so the whole run can be repeated. initial_layouts (like force_directed_layout gives) get
+    # tried before any random ones.
+    # With prune on, a layout whose score_upper_bound can't beat the best layout yet isn't routed
+    # at all, and the "sequential" router drops each connection order as soon as it can't win (see
+    # route_connections). How many were skipped goes in routing_stats["pruned"] and how many were
+    # stopped in routing_stats["aborted"].
+    # It also stops once time_budget seconds have gone by, or once cancel (anything with an
+    # is_set(), like a threading.Event) is set. progress gets called with each event from
+    # monte_carlo_steps.
+    # With a layout_cache, a circuit that's been laid out before gets its cached layout back right
+    # away if it reaches the target score (unless use_layout_cache is off), or else the search has to
+    # beat it, and a better layout than the cached one gets cached.
+    # The layouts are only tried out as Layouts; the schematic is left alone until the best one
+    # gets committed at the end (see commit_layout).
+    def monte_carlo(self, max_iters=1000, engine="a_star", orderings=None, router="sequential", batch_size=64, seed=None,
+                    initial_layouts=None, prune=True, time_budget=None, cancel=None, progress=None, use_layout_cache=True):
+        for event in self.monte_carlo_steps(max_iters, engine, orderings, router, batch_size, seed,
+                                            initial_layouts, prune, time_budget, cancel, use_layout_cache):
+            if progress != None:
+                progress(event)
+
+    # monte_carlo as a generator: after every iteration it yields an event, which is routing_stats
+    # (including how many layouts were "routed" and "failed") plus the "iteration", the seconds
+    # "elapsed", the "best_score" and "best_layout" (a Layout, or None until one gets routed) so
+    # far, and whether this iteration found a "new_best". The best layout yet is committed once
+    # it's done, even if it's stopped early (by breaking out of it or closing it).
+    # A layout from the layout_cache (or placement_library) that reaches the target score comes back
+    # as a single event for iteration 0, and a worse one is the best layout to start with.
+    def monte_carlo_steps(self, max_iters=1000, engine="a_star", orderings=None, router="sequential", batch_size=64,
+                          seed=None, initial_layouts=None, prune=True, time_budget=None, cancel=None,
+                          use_layout_cache=True):
+        if not router in self.ROUTERS:
+            raise ValueError(f"Invalid router \"{router}\"")
+        if router != "sequential" and engine != "a_star":
+            raise ValueError(f"The {router} router only works with the a_star engine")
+        if router == "negotiated" and self.routing_connectivity != 4:
+            raise ValueError("The negotiated router only works with a routing connectivity of 4")
         self.initialize_connections_list()
-        best_layout = [-1, None]
+        self.reset_routing_stats()
+        if seed != None:
+            self.rng = np.random.default_rng(seed)
+        start_time = time.monotonic()
+        # The best routed Layout yet
+        best_layout = None
+        best_score = -1
+        placements = []
+        if initial_layouts is not None:
+            placements = [np.array(placement) for placement in initial_layouts]
+
+        cached_layout = None
+        if use_layout_cache:
+            cached_layout = self.get_cached_layout()
+            if cached_layout == None:
+                cached_layout = self.get_library_layout(
+                    router, engine, orderings)
 
         # run the iterations up until the target score is reached or we've reached the max_iters
+        # (or run out of time, or get cancelled)
         i = 0
-        while (best_layout[0] < self.target_score) and (i < max_iters):
-            # Clear some lists to make sure we don't have straggling data
-            self.paths.clear()
-            self.pin_placement_dict.clear()
-
-            # Randomize the layout of the pins
-            # Get the pin placement dict based on the layout
-            # Then run A*
-            self.randomize_layout()
-            self.initialize_pin_placement_dict()
-            paths = self.run_a_star()
-
-            # Try connection list as is; if that doesn't work then randomize the order and try again.
-            # We do this because the first pin as first pick and probably the best pick. So, it might
-            # ruin the chance for another pin making it to their other pin
-            j = 0
-            while paths == [] and j < 4*len(self.connections_list):
-                np.random.shuffle(self.connections_list)
-                paths = self.run_a_star()
-                j += 1
-            if paths == []:
+        try:
+            if cached_layout != None:
+                best_layout = cached_layout
+                best_score = cached_layout.score
+                # A layout that doesn't reach the target score is just the one to beat
+                if best_score >= self.target_score:
+                    yield self.progress_event(0, start_time, best_layout, True)
+                    return
+
+            while (best_score < self.target_score) and (i < max_iters):
+                if time_budget != None and time.monotonic() - start_time >= time_budget:
+                    break
+                if cancel != None and cancel.is_set():
+                    break
+                new_best = False
+
+                # Draw the next batch of random layouts when we run out. The ones that
+                # couldn't be packed onto the board count as failed iterations.
+                if len(placements) == 0:
+                    n_layouts = min(batch_size, max_iters - i)
+                    placements = list(self.sample_layouts(n_layouts))
+                    i += n_layouts - len(placements)
+                    self.routing_stats["failed"] += n_layouts - len(placements)
+                    continue
+
+                # Route the next random layout
+                placement = placements.pop(0)
+                if prune and best_layout != None and \
+                        self.score_upper_bound(self.pin_placement(placement), router) <= best_score:
+                    self.routing_stats["pruned"] += 1
+                else:
+                    layout, routing_stats = self.route_layout(placement, router, engine, orderings,
+                                                              best_score if prune and best_layout != None else None)
+                    add_routing_stats(self.routing_stats, routing_stats)
+
+                    if not layout.is_routed():
+                        if routing_stats["aborted"] == 0:
+                            self.routing_stats["failed"] += 1
+                    else:
+                        # Check if the score is better than the best yet. If so, keep it as
+                        # the best then move on to the next iteration
+                        self.routing_stats["routed"] += 1
+                        if layout.score > best_score:
+                            best_layout = layout
+                            best_score = layout.score
+                            new_best = True
                 i += 1
+
+                yield self.progress_event(i, start_time, best_layout, new_best)
+        finally:
+            # The best layout will hopefully not be None. If it is,
+            # we tell the user to just try again.
+            self.commit_layout(best_layout)
+            self.cache_layout(best_layout)
+            self.add_to_library(best_layout)
+
+    # What monte_carlo_steps yields (see there)
+    def progress_event(self, iteration, start_time, best_layout, new_best):
+        return self.routing_stats | {"iteration": iteration, "elapsed": time.monotonic() - start_time,
+                                     "best_score": -1 if best_layout == None else best_layout.score,
+                                     "best_layout": best_layout,
+                                     "new_best": new_best}
+
+    # A hash of everything a layout depends on: the components and their types, how they're
+    # connected, the grid and score settings, and the routing connectivity. Labels, schematic
+    # positions and comments don't change the layout, so they're left out.
+    def layout_key(self):
+        connections = set()
+        for component in self.components.values():
+            for pin_id, connected_pin_ids in component.connections.items():
+                for connected_pin_id in connected_pin_ids:
+                    connections.add(tuple(sorted([pin_id, connected_pin_id])))
+        netlist = {
+            "components": sorted([component_key, component.__class__.__name__]
+                                 for component_key, component in self.components.items()),
+            "connections": sorted(connections),
+            "n_grid_spaces": self.n_grid_spaces,
+            "a_star_grid_padding": self.a_star_grid_padding,
+            "target_score": self.target_score,
+            "area_weight": self.area_weight,
+            "path_length_weight": self.path_length_weight,
+            "routing_connectivity": self.routing_connectivity
+        }
+        return hashlib.sha256(json.dumps(netlist, sort_keys=True).encode()).hexdigest()
+
+    # The Layout the layout_cache has for this circuit, or None
+    def get_cached_layout(self):
+        if self.layout_cache == None:
+            return None
+        layout = self.layout_cache.get(self.layout_key())
+        if layout == None or set(layout["pcb_positions"]) != set(self.components):
+            return None
+        return Layout([layout["pcb_positions"][component_key] for component_key in self.components],
+                      [decode_path(path) for path in layout["paths"]], layout["score"])
+
+    # Puts a Layout in the layout_cache if it could be routed and it's better than what's there
+    def cache_layout(self, layout):
+        if self.layout_cache == None or layout == None or not layout.is_routed():
+            return
+        cached_layout = self.get_cached_layout()
+        if cached_layout != None and cached_layout.score >= layout.score:
+            return
+        self.layout_cache.put(self.layout_key(), {
+            "score": float(layout.score),
+            "paths": [encode_path(path) for path in layout.paths],
+            "pcb_positions": dict(zip(self.components, layout.pcb_positions()))
+        })
+
+    # The circuit as a graph for topology_key and find_isomorphism: a node for every component
+    # (labeled with its type) and every connection in the connections list (labeled "connection"),
+    # and an edge between a connection and the components of its two pins, labeled with which pin
+    # it is. Component ids and labels don't matter, but which pins are wired together does, since
+    # those are the pairs the "sequential" router routes.
+    def topology_graph(self):
+        self.initialize_connections_list()
+        labels = {}
+        pin_owner = {}
+        for component_key, component in self.components.items():
+            labels[component_key] = component.__class__.__name__
+            for k, pin_id in enumerate(component.connections.keys()):
+                pin_owner[pin_id] = (component_key, k)
+        edges = []
+        for n, connection in enumerate(self.connections_list):
+            labels[f"connection_{n}"] = "connection"
+            for pin_id in connection:
+                component_key, k = pin_owner[pin_id]
+                edges.append([component_key, f"connection_{n}", k])
+        return {"labels": labels, "edges": edges}
+
+    # A hash that is the same for circuits with the same topology (see topology_graph), from
+    # refining the graph's node colors until they stop splitting (Weisfeiler-Lehman). Different
+    # topologies can very rarely get the same hash, so find_isomorphism has the final say.
+    def topology_key(self):
+        graph = self.topology_graph()
+        colors, signatures = refine_colors(graph["edges"], initial_colors(graph["labels"]))
+        color_counts = np.bincount(list(colors.values())).tolist()
+        return hashlib.sha256(json.dumps([signatures, color_counts]).encode()).hexdigest()
+
+    # The placement_library's placement for a circuit with the same topology and grid settings,
+    # put on these components and routed. If one of them can't be routed the next one gets tried.
+    # Returns the routed Layout, or None if there isn't one or none of them could be routed.
+    def get_library_layout(self, router="sequential", engine="a_star", orderings=None):
+        if self.placement_library == None:
+            return None
+        entries = self.placement_library.get(self.topology_key())
+        if entries == None:
+            return None
+
+        graph = self.topology_graph()
+        for entry in entries["placements"]:
+            if entry["n_grid_spaces"] != self.n_grid_spaces or entry["a_star_grid_padding"] != self.a_star_grid_padding:
+                continue
+            mapping = find_isomorphism(entry["graph"], graph)
+            if mapping == None:
                 continue
 
-            # Check if the score is better than the best yet. If so, set the new score and
-            # layout as the best then move on to the next iteration
-            curr_runs_score = self.calculate_score(paths)
-            if curr_runs_score > best_layout[0]:
-                best_layout[0] = curr_runs_score
-                best_layout[1] = paths
-            i += 1
+            placement = np.zeros((len(self.components), 2, 2), dtype=np.int64)
+            component_index = {component_key: c for c,
+                               component_key in enumerate(self.components)}
+            for component_key, pcb_position in entry["pcb_positions"].items():
+                placement[component_index[mapping[component_key]]] = pcb_position
+            layout, routing_stats = self.route_layout(placement, router, engine, orderings)
+            add_routing_stats(self.routing_stats, routing_stats)
+            if not layout.is_routed():
+                continue
+            self.routing_stats["routed"] += 1
+            return layout
+        return None
+
+    # Puts a Layout's placement in the placement_library if it could be routed and it's
+    # better than the one there for this topology and grid settings
+    def add_to_library(self, layout):
+        if self.placement_library == None or layout == None or not layout.is_routed():
+            return
+        key = self.topology_key()
+        graph = self.topology_graph()
+        entry = {
+            "graph": graph,
+            "n_grid_spaces": self.n_grid_spaces,
+            "a_star_grid_padding": self.a_star_grid_padding,
+            "score": float(layout.score),
+            "pcb_positions": dict(zip(self.components, layout.pcb_positions()))
+        }
+
+        entries = self.placement_library.get(key)
+        if entries == None:
+            entries = {"placements": []}
+        # Replace the placement for the same circuit and grid settings if there is one
+        placements = []
+        for old_entry in entries["placements"]:
+            if old_entry["n_grid_spaces"] == self.n_grid_spaces and old_entry["a_star_grid_padding"] == self.a_star_grid_padding \
+                    and find_isomorphism(old_entry["graph"], graph) != None:
+                if old_entry["score"] >= entry["score"]:
+                    return
+            else:
+                placements.append(old_entry)
+        entries["placements"] = placements + [entry]
+        self.placement_library.put(key, entries)
+
+    # Routes a placement (like sample_layouts gives) with one of the ROUTERS (see monte_carlo for
+    # the arguments) and scores it. The order of the connections list matters for the "sequential"
+    # router since a path can ruin the chance for another pin making it to their other pin, so it
+    # tries the most promising orders first, then different ones until one works. score_to_beat
+    # lets the "sequential" router drop orders early (see route_connections), and rng is what it
+    # shuffles random orders with (self.rng by default).
+    # Returns a new Layout, without paths (and with a score of -1) if it couldn't be routed, and the
+    # routing_stats of its searches (with "aborted" set if the "sequential" router gave up on it).
+    # Nothing on the schematic gets changed, so more than one thread can route layouts for it at
+    # once, as long as each one gives its own rng.
+    def route_layout(self, placement, router="sequential", engine="a_star", orderings=None, score_to_beat=None,
+                     rng=None):
+        pin_positions = self.pin_placement(placement)
+        routing_stats = {"searches": 0, "expanded_nodes": 0, "aborted": 0}
+        if router == "sequential":
+            paths, failed_connection, router_stats = self.route_connections(pin_positions, engine, orderings,
+                                                                            score_to_beat=score_to_beat, rng=rng)
+        else:
+            paths, failed_connection, router_stats = getattr(self, self.ROUTERS[router])(pin_positions)
+        add_routing_stats(routing_stats, router_stats)
+        if paths == []:
+            return Layout(placement), routing_stats
+        return Layout(placement, paths, self.calculate_score(paths)), routing_stats
+
+    # The layout that's on the schematic now: where the components are, the paths and their score
+    def get_layout(self):
+        return Layout([component.pcb_position for component in self.components.values()],
+                      self.paths if self.paths != None else (), self.curr_runs_score)
+
+    # Puts a Layout on the schematic: the components get moved to its placement and its paths and
+    # score are kept. If it couldn't be routed (or is None, when nothing was found) the paths are
+    # None; the components are still moved if there is a placement.
+    def commit_layout(self, layout):
+        if layout == None:
+            self.paths = None
+            self.curr_runs_score = -1
+            return
+        for component, pcb_position in zip(self.components.values(), layout.pcb_positions()):
+            component.set_pcb_pos(pcb_position)
+        self.initialize_pin_placement_dict()
+        if layout.is_routed():
+            self.paths = [dict(path) for path in layout.paths]
+            self.curr_runs_score = layout.score
+        else:
+            self.paths = None
+            self.curr_runs_score = -1
+
+    # Force directed placement: every pin is pulled towards the pins it's connected to, pins of
+    # different components push each other away, and the two pins of a component are held one space
+    # apart. After n_iters steps (each one moving things a bit less) the components get snapped onto
+    # the board one at a time, most connected first, to the free spot and orientation closest to where
+    # the forces left them. If the ones placed first leave no room for the rest, it gives a random
+    # layout from sample_layouts instead. Gives one layout like sample_layouts does, for monte_carlo's
+    # initial_layouts or simulated_annealing's initial_layout.
+    def force_directed_layout(self, n_iters=200, attraction=.1, repulsion=1, rng=None):
+        if rng == None:
+            rng = self.rng
+        n = self.n_grid_spaces
+        n_components = len(self.components)
+        if 2*n_components > n*n:
+            raise ValueError("Too many components for the grid")
+        self.initialize_connections_list()
 
-        # The best layout will hopefully not be an empty list. If it is,
-        # we tell the user to just try again.
-        self.paths = best_layout[1]
+        # Pins 2c and 2c + 1 belong to component c
+        pin_index = {}
+        for c, component in enumerate(self.components.values()):
+            for k, pin_id in enumerate(component.connections.keys()):
+                pin_index[pin_id] = 2*c + k
+        connections = np.array([[pin_index[pin_1_id], pin_index[pin_2_id]]
+                                for pin_1_id, pin_2_id in self.connections_list], dtype=np.int64).reshape(-1, 2)
+        owner = np.arange(2*n_components) // 2
+        same_component = owner[:, None] == owner[None, :]
+
+        # Start every component somewhere random with its pins next to each other
+        pins = np.empty((2*n_components, 2))
+        pins[0::2] = rng.uniform(0, n - 1, size=(n_components, 2))
+        pins[1::2] = pins[0::2] + rng.uniform(-1, 1, size=(n_components, 2))
+
+        step = 1
+        for _ in range(0, n_iters):
+            forces = np.zeros_like(pins)
+
+            # Connected pins pull on each other like springs
+            pull = attraction*(pins[connections[:, 1]] - pins[connections[:, 0]])
+            np.add.at(forces, connections[:, 0], pull)
+            np.add.at(forces, connections[:, 1], -pull)
+
+            # Pins of different components push each other away, harder the closer they are
+            offsets = pins[:, None, :] - pins[None, :, :]
+            dist_sq = (offsets**2).sum(axis=2) + .01
+            push = repulsion / dist_sq
+            push[same_component] = 0
+            forces += (offsets * (push / np.sqrt(dist_sq))[:, :, None]).sum(axis=1)
+
+            # Keep each component one space long
+            span = pins[1::2] - pins[0::2]
+            length = np.sqrt((span**2).sum(axis=1, keepdims=True)) + 1e-9
+            stretch = (length - 1) * span / length / 2
+            forces[0::2] += stretch
+            forces[1::2] -= stretch
+
+            # Don't let anything move more than step spaces at once
+            size = np.sqrt((forces**2).sum(axis=1, keepdims=True))
+            pins += forces * np.minimum(1, step / (size + 1e-9))
+            pins = np.clip(pins, 0, n - 1)
+            step = max(step * .98, .05)
+
+        # Snap the components onto the board
+        table = self.placement_table()
+        table_pins = np.stack(np.divmod(table, n), axis=-1)
+        occupied = np.zeros(n*n, dtype=bool)
+        n_connections = np.bincount(connections.ravel(), minlength=2*n_components)
+        n_connections = n_connections[0::2] + n_connections[1::2]
+        layout = np.zeros((n_components, 2, 2), dtype=np.int64)
+        for c in np.argsort(-n_connections, kind="stable"):
+            cost = ((table_pins - pins[2*c:2*c + 2])**2).sum(axis=(1, 2))
+            cost[occupied[table[:, 0]] | occupied[table[:, 1]]] = np.inf
+            # The ones placed so far left no room for this one, so use a random layout instead
+            if np.isinf(cost).all():
+                layouts = self.sample_layouts(16, rng)
+                if len(layouts) == 0:
+                    raise ValueError("Couldn't fit the components on the grid")
+                return layouts[0]
+            pick = int(np.argmin(cost))
+            occupied[table[pick]] = True
+            layout[c] = table_pins[pick]
+
+        return layout + int(self.a_star_grid_padding/2)
+
+    # Places the components with force_directed_layout and routes that layout (see monte_carlo
+    # for router, engine and orderings). The layout gets committed like monte_carlo does, with the
+    # paths None if it couldn't be routed.
+    def force_directed_placement(self, n_iters=200, router="sequential", engine="a_star", orderings=None, seed=None):
+        if not router in self.ROUTERS:
+            raise ValueError(f"Invalid router \"{router}\"")
+        self.reset_routing_stats()
+        if seed != None:
+            self.rng = np.random.default_rng(seed)
+        placement = self.force_directed_layout(n_iters)
+        layout, routing_stats = self.route_layout(placement, router, engine, orderings)
+        add_routing_stats(self.routing_stats, routing_stats)
+        self.commit_layout(layout)
+
+    # Simulated annealing: instead of throwing every layout away like monte_carlo does, keep making
+    # small changes to one layout. Each step either moves a component somewhere else, turns it to
+    # another of the PCB_ORIENTATIONS (around its first pin), or swaps two components. A change that
+    # makes the score better is always kept, and a worse one is kept with probability
+    # exp(score change / temperature) (Metropolis), so early on it can get out of bad spots. The
+    # temperature starts at start_temperature and gets multiplied by cooling_rate every
+    # steps_per_temperature steps. A layout that can't be routed counts as a score of -1.
+    # It starts from initial_layout (like sample_layouts gives), or where the components are if
+    # they've all been placed somewhere that still fits (see placement_fits), or a random layout. It stops after max_steps or at the target score.
+    # router, engine and orderings are the same as for monte_carlo.
+    def simulated_annealing(self, max_steps=1000, start_temperature=.05, cooling_rate=.95, steps_per_temperature=10,
+                            initial_layout=None, router="sequential", engine="a_star", orderings=None, seed=None):
+        if not router in self.ROUTERS:
+            raise ValueError(f"Invalid router \"{router}\"")
+        if cooling_rate <= 0 or cooling_rate > 1:
+            raise ValueError("Invalid cooling rate")
+        self.initialize_connections_list()
+        self.reset_routing_stats()
+        if seed != None:
+            self.rng = np.random.default_rng(seed)
+
+        placement = None
+        if initial_layout is not None:
+            placement = np.array(initial_layout)
+        elif all(component.pcb_position != [] for component in self.components.values()):
+            placement = np.array(
+                [component.pcb_position for component in self.components.values()])
+            # Where they were placed for a bigger grid (or in an older .circ) might not fit anymore
+            if not self.placement_fits(placement):
+                placement = None
+        if placement is None:
+            placement = self.sample_layouts(1)[0]
+
+        layout, routing_stats = self.route_layout(placement, router, engine, orderings)
+        add_routing_stats(self.routing_stats, routing_stats)
+        best_layout = layout if layout.is_routed() else None
+
+        temperature = start_temperature
+        step = 0
+        while (best_layout == None or best_layout.score < self.target_score) and step < max_steps:
+            new_placement = self.neighbor_layout(placement)
+            new_layout, routing_stats = self.route_layout(new_placement, router, engine, orderings)
+            add_routing_stats(self.routing_stats, routing_stats)
+
+            if new_layout.score >= layout.score or self.rng.random() < np.exp((new_layout.score - layout.score)/temperature):
+                placement = new_placement
+                layout = new_layout
+                if layout.is_routed() and (best_layout == None or layout.score > best_layout.score):
+                    best_layout = layout
+
+            step += 1
+            if step % steps_per_temperature == 0:
+                temperature *= cooling_rate
+
+        self.commit_layout(best_layout)
+
+    # Makes a small random change to a layout for simulated_annealing: move a component, turn it, or
+    # swap two of them. The change always leaves every pin on the board and no two on the same space.
+    def neighbor_layout(self, layout):
+        low = int(self.a_star_grid_padding/2)
+        high = low + self.n_grid_spaces
+        n_components = len(layout)
+
+        while True:
+            new_layout = layout.copy()
+            c = int(self.rng.integers(0, n_components))
+            move = self.rng.integers(0, 3)
+
+            # move
+            if move == 0:
+                pin_1_pos = self.rng.integers(low, high, size=2)
+                orientation = PCB_ORIENTATIONS[int(self.rng.integers(0, 4))]
+                new_layout[c] = [pin_1_pos, pin_1_pos + orientation]
+            # turn
+            elif move == 1:
+                orientation = PCB_ORIENTATIONS[int(self.rng.integers(0, 4))]
+                new_layout[c, 1] = new_layout[c, 0] + orientation
+            # swap
+            else:
+                if n_components < 2:
+                    continue
+                other = int(self.rng.integers(0, n_components))
+                new_layout[[c, other]] = new_layout[[other, c]]
+
+            if (new_layout == layout).all():
+                continue
+            pins = new_layout.reshape(-1, 2)
+            if pins.min() < low or pins.max() >= high:
+                continue
+            if len(np.unique(pins, axis=0)) < len(pins):
+                continue
+            return new_layout
+
+    # monte_carlo spread over n_workers processes (all the cpus by default). The iterations are
+    # done in rounds: each round every worker runs chunk_size iterations with its own seed (made
+    # from seed, the worker number, and the round number), and then the best layout of all of them
+    # is kept (the lowest worker number wins a tie). As soon as a round reaches the target score,
+    # no more rounds are started. Since that only depends on what each round got, the result is the
+    # same as running the same chunks one after another with use_processes=False, given the same
+    # seed, n_workers and chunk_size. monte_carlo_kwargs are passed on to monte_carlo.
+    # time_budget and cancel work like they do for monte_carlo, except cancel is only checked
+    # between rounds (the workers get whatever is left of the time budget). progress gets called
+    # after every round with an event like monte_carlo_steps gives, where "iteration" is how many
+    # iterations all of the rounds so far were given. The layout_cache and placement_library are used
+    # like monte_carlo uses them.
+    def parallel_monte_carlo(self, max_iters=1000, n_workers=None, seed=None, chunk_size=50, use_processes=True,
+                             time_budget=None, cancel=None, progress=None, use_layout_cache=True, **monte_carlo_kwargs):
+        if n_workers == None:
+            n_workers = os.cpu_count()
+        if seed == None:
+            seed = np.random.SeedSequence().entropy
+        self.initialize_connections_list()
+        schematic_json = json.dumps(self.to_dict())
+        # to_dict doesn't save how the router moves, so the workers get it separately
+        routing_parameters = [self.routing_connectivity, self.heuristic_weight]
+        self.reset_routing_stats()
+        best_layout = None
+        best_score = -1
+        if use_layout_cache:
+            best_layout = self.get_cached_layout()
+            if best_layout == None:
+                best_layout = self.get_library_layout(monte_carlo_kwargs.get("router", "sequential"),
+                                                      monte_carlo_kwargs.get("engine", "a_star"),
+                                                      monte_carlo_kwargs.get("orderings"))
+            # A layout that doesn't reach the target score is just the one to beat
+            if best_layout != None:
+                best_score = best_layout.score
+                if best_score >= self.target_score:
+                    self.commit_layout(best_layout)
+                    self.cache_layout(best_layout)
+                    return
+        start_time = time.monotonic()
+
+        executor = ProcessPoolExecutor(n_workers) if use_processes else None
+        try:
+            iters_left = max_iters
+            round_index = 0
+            while best_score < self.target_score and iters_left > 0:
+                if cancel != None and cancel.is_set():
+                    break
+                if time_budget != None:
+                    time_left = time_budget - (time.monotonic() - start_time)
+                    if time_left <= 0:
+                        break
+                    monte_carlo_kwargs["time_budget"] = time_left
+                # Split this round's iterations between the workers
+                n_iters = min(chunk_size*n_workers, iters_left)
+                worker_iters = [n_iters//n_workers + (1 if worker < n_iters % n_workers else 0)
+                                for worker in range(0, n_workers)]
+                worker_iters = [n for n in worker_iters if n > 0]
+                chunks = [(schematic_json, routing_parameters, n, [seed, worker, round_index], monte_carlo_kwargs)
+                          for worker, n in enumerate(worker_iters)]
+
+                if executor != None:
+                    results = list(executor.map(
+                        run_monte_carlo_chunk, *zip(*chunks)))
+                else:
+                    results = [run_monte_carlo_chunk(*chunk)
+                               for chunk in chunks]
+
+                new_best = False
+                for layout, routing_stats in results:
+                    for stat in self.routing_stats:
+                        self.routing_stats[stat] += routing_stats[stat]
+                    if layout != None and layout.score > best_score:
+                        best_layout = layout
+                        best_score = layout.score
+                        new_best = True
+
+                iters_left -= n_iters
+                round_index += 1
+                if progress != None:
+                    progress(self.progress_event(
+                        max_iters - iters_left, start_time, best_layout, new_best))
+        finally:
+            if executor != None:
+                executor.shutdown()
+
+        self.commit_layout(best_layout)
+        self.cache_layout(best_layout)
+        self.add_to_library(best_layout)
+
+    # Starts routing_stats over
+    def reset_routing_stats(self):
+        self.routing_stats = {"searches": 0, "expanded_nodes": 0,
+                              "routed": 0, "failed": 0, "pruned": 0, "aborted": 0}
 
     # Used to find the score of a board
     def pcb_area(self, paths):
@@ -905,11 +2366,9 @@ class Schematic:
         min_i = int((self.n_grid_spaces + self.a_star_grid_padding)/2)
         max_i = int((self.n_grid_spaces + self.a_star_grid_padding)/2)
 
+        # A path never goes outside the box around its corners
         for path in paths:
-            for path_node in path["path_nodes"]:
-                grid_i = path_node[0]
-                grid_j = path_node[1]
-
+            for grid_i, grid_j in path["corners"].tolist():
                 min_i = min(grid_i, min_i)
                 max_i = max(grid_i, max_i)
                 min_j = min(grid_j, min_j)
@@ -920,80 +2379,306 @@ class Schematic:
     # For calculating how good a set of paths (pcb layout) is.
     # It is based on total path length and total area (including paths)
     def calculate_score(self, paths):
+        total_path_length = 0
+        for path in paths:
+            total_path_length += path["length"]
+        min_max = self.pcb_area(paths)
+        total_area = (min_max[1]-min_max[0])*(min_max[1]-min_max[0])
+
+        return self.score_from(total_path_length, total_area, len(paths))
+
+    # The score for n_paths paths that are total_path_length long altogether and take up total_area
+    def score_from(self, total_path_length, total_area, n_paths):
         worst_total_area = np.square(
             self.n_grid_spaces + self.a_star_grid_padding)
-        best_total_area = len(paths)*2
+        best_total_area = n_paths*2
         # based on taking every path in a grid
         worst_path_length = 10 * \
             np.square(self.n_grid_spaces + self.a_star_grid_padding)
         best_path_length = 10  # the pins are right next to one another
 
-        total_path_length = 0
-        for path in paths:
-            total_path_length += path["length"]
-        min_max = self.pcb_area(paths)
-        total_area = (min_max[1]-min_max[0])*(min_max[1]-min_max[0])
-
         score = ((worst_total_area - total_area)/(worst_total_area-best_total_area))*self.area_weight + \
             (worst_path_length - total_path_length) / \
             (worst_path_length - best_path_length)*self.path_length_weight
 
         return score
 
+    # The best score calculate_score could give the pins at pin_positions (see pin_placement), without routing them.
+    # Every path is at least as long as the distance between its ends, and for the "net_trees"
+    # router a net's traces together are at least as long as the half perimeter of the box around
+    # its pins (with diagonal moves, the distance between its two farthest pins). The area has to
+    # take in all of the connected pins. Nothing has to be routed to know a layout is worse than this.
+    def score_upper_bound(self, pin_positions, router="sequential"):
+        if router == "net_trees":
+            groups = self.get_nets()
+        else:
+            groups = self.connections_list
+        min_path_length = sum(self.min_path_length(pins, pin_positions) for pins in groups)
+
+        # The routers never give more paths than there are connections, and
+        # more paths only make the best area smaller
+        return self.score_from(min_path_length, self.min_total_area(pin_positions), len(self.connections_list))
+
+    # How long the traces joining a group of pins (a connection or a net) have to be at least
+    def min_path_length(self, pins, pin_positions):
+        positions = np.array([pin_positions[pin_id]
+                              for pin_id in pins])
+        if self.routing_connectivity == 8:
+            offsets = np.abs(positions[:, None, :] - positions[None, :, :])
+            di = offsets[:, :, 0]
+            dj = offsets[:, :, 1]
+            return (14*np.minimum(di, dj) + 10*np.abs(di - dj)).max()
+        span = positions.max(axis=0) - positions.min(axis=0)
+        return 10*(span[0] + span[1])
+
+    # The smallest area calculate_score could give the pins at pin_positions: pcb_area always takes
+    # in the middle of the grid and the ends of every path (and these corners too if there are any)
+    def min_total_area(self, pin_positions, corners=[]):
+        center = int((self.n_grid_spaces + self.a_star_grid_padding)/2)
+        grid_i = [pin_positions[pin_id][0]
+                  for connection in self.connections_list for pin_id in connection]
+        grid_i += [corner[0] for corner in corners] + [center]
+        return np.square(max(grid_i) - min(grid_i))
+
     # This method goes through each pair of connections and finds a path between them
-    # It keeps track of new paths as obstacles as well.
-    def run_a_star(self):
+    # It keeps track of new paths as obstacles as well. One grid is used for the whole layout:
+    # each path is blocked on it once it's found, and the start and goal pins are only
+    # unblocked while their own path is being looked for.
+    # engine picks the router that is used (see PcbGrid.ROUTING_ENGINES), pin_positions is where
+    # the pins are (see pin_placement, pin_placement_dict by default) and connections is the order
+    # to route them in (the connections list by default).
+    # When score_to_beat is set, it gives up (and gives None for the paths) as soon as the paths so far
+    # plus the shortest the rest could be (see min_path_length) can't score better than it anymore.
+    # Returns the paths ([] if a connection couldn't be routed), the [start_id, goal_id] connection
+    # that couldn't be routed (None if there wasn't one) and the routing_stats of its searches.
+    def run_a_star(self, engine="a_star", pin_positions=None, connections=None, score_to_beat=None):
+        if pin_positions == None:
+            pin_positions = self.pin_placement_dict
+        if connections == None:
+            connections = self.connections_list
         paths = []
-        not_allowed = self.not_allowed_pcb_spots()
-
-        for start_id, goal_id in self.connections_list:
+        grid = PcbGrid(self.n_grid_spaces + self.a_star_grid_padding, self.pcb_occupancy(pin_positions),
+                       self.routing_connectivity, self.heuristic_weight, self.route_cache)
+        if score_to_beat != None:
+            min_path_lengths = [self.min_path_length(connection, pin_positions)
+                                for connection in connections]
+            min_length_left = sum(min_path_lengths)
+            total_path_length = 0
+            corners = []
+
+        for start_id, goal_id in connections:
             path = {}
-            start_pos = self.pin_placement_dict[start_id]
-            goal_pos = self.pin_placement_dict[goal_id]
-            not_allowed.remove(start_pos)
-            not_allowed.remove(goal_pos)
-            grid = PcbGrid(self.n_grid_spaces +
-                           self.a_star_grid_padding, not_allowed)
-
-            start_node = grid.nodes[str(start_pos)]
-            goal_node = grid.nodes[str(goal_pos)]
+            start_node = grid.node_at(pin_positions[start_id])
+            goal_node = grid.node_at(pin_positions[goal_id])
+            grid.unblock(start_node)
+            grid.unblock(goal_node)
 
-            no_paths = grid.a_star(start_node, goal_node)
+            no_paths = grid.route(start_node, goal_node, engine)
             if no_paths:
-                return []
+                return [], [start_id, goal_id], grid.routing_stats()
 
-            path["path_nodes"] = grid.retrace_path(start_node, goal_node)
+            path_nodes = grid.retrace_path(start_node, goal_node)
 
-            not_allowed += path["path_nodes"]
-            path["length"] = goal_node.g_cost+1
+            # The path starts and ends on the pins, so this blocks them again too
+            grid.block_path(path_nodes)
+            path["corners"] = path_corners(path_nodes)
+            path["length"] = int(grid.g_cost[goal_node])+1
             path["path_id"] = f"{start_id}->{goal_id}"
 
             paths.append(path)
-            not_allowed.append(start_pos)
-            not_allowed.append(goal_pos)
-
-        return paths
-
-    # Used to set the grid to be a bounding box of the points actually used in it. Returns the dims of
-    # the new layout.
-    def trim_pcb_layout(self):
-        print(self.paths)
-        pcb_dims = self.pcb_area(self.paths)
-        for i in range(0, len(self.paths)):
-            nodes = self.paths[i]["path_nodes"]
-            for j in range(0, len(nodes)):
-                node = nodes[j]
-                self.paths[i]["path_nodes"][j] = np.add(np.subtract(
-                    node, (pcb_dims[0], pcb_dims[2])), [1, 1]).tolist()
 
-        for component in self.components.values():
-            self.components[f"component_{component.id}"].set_pcb_pos(np.subtract(
-                component.pcb_position, (pcb_dims[0], pcb_dims[2])).tolist())
+            if score_to_beat != None:
+                total_path_length += path["length"]
+                min_length_left -= min_path_lengths[len(paths) - 1]
+                corners += path["corners"].tolist()
+                best_score = self.score_from(total_path_length + min_length_left,
+                                             self.min_total_area(pin_positions, corners), len(connections))
+                if best_score <= score_to_beat:
+                    return None, None, grid.routing_stats()
+
+        return paths, None, grid.routing_stats()
+
+    # PathFinder's negotiated congestion routing. Instead of a blocked connection ruining the whole
+    # layout, traces are allowed to share grid spaces for a price: each round a space costs more the
+    # more traces are on it (present_factor, which grows by present_growth every round) and the more
+    # rounds it's been fought over (its history, which grows by history_factor). After each round only
+    # the connections that share a space get ripped up and rerouted, until no spaces are shared or
+    # max_rounds is reached. Pins are still hard obstacles for everything except their own traces.
+    # Only shared spaces count as a conflict, and with diagonal moves two traces could cross without
+    # sharing one, so this only works with a routing connectivity of 4.
+    # Returns the paths, failed connection and routing_stats like run_a_star, with no paths if it
+    # couldn't make a legal layout.
+    def run_negotiated(self, pin_positions, max_rounds=30, present_factor=.5, present_growth=1.5, history_factor=1):
+        if self.routing_connectivity != 4:
+            raise ValueError("The negotiated router only works with a routing connectivity of 4")
+        grid = PcbGrid(self.n_grid_spaces + self.a_star_grid_padding, self.pcb_occupancy(pin_positions),
+                       self.routing_connectivity, self.heuristic_weight)
+        # How many traces use each space (not counting their pins) and how long it's been fought over
+        occupancy = np.zeros(grid.dims*grid.dims, dtype=np.int64)
+        history = np.zeros(grid.dims*grid.dims, dtype=np.float64)
+        routes = [None for connection in self.connections_list]
+        to_route = list(range(0, len(self.connections_list)))
+
+        for round_index in range(0, max_rounds):
+            for k in to_route:
+                start_id, goal_id = self.connections_list[k]
+                # rip up the old route
+                if routes[k] != None:
+                    occupancy[routes[k]] -= 1
+
+                start_node = grid.node_at(pin_positions[start_id])
+                goal_node = grid.node_at(pin_positions[goal_id])
+                grid.congestion = (1 + history) * \
+                    (1 + present_factor*occupancy)
+                grid.unblock(start_node)
+                grid.unblock(goal_node)
+                no_paths = grid.route(start_node, goal_node)
+                grid.block(start_node)
+                grid.block(goal_node)
+
+                # Only pins can block a trace here, so no amount of negotiating will help
+                if no_paths:
+                    return [], [start_id, goal_id], grid.routing_stats()
+
+                path_nodes = grid.retrace_path(start_node, goal_node)
+                routes[k] = [grid.node_at(pos) for pos in path_nodes[1:-1]]
+                occupancy[routes[k]] += 1
+
+            overused = occupancy > 1
+            if not overused.any():
+                break
+            history[overused] += history_factor * (occupancy[overused] - 1)
+            present_factor *= present_growth
+            to_route = [k for k in range(0, len(routes))
+                        if overused[routes[k]].any()]
+        else:
+            return [], None, grid.routing_stats()
+
+        # Everything is legal, so put the paths together with their real (uncongested) lengths
+        grid.congestion = None
+        paths = []
+        for k, (start_id, goal_id) in enumerate(self.connections_list):
+            path = {}
+            start_node = grid.node_at(pin_positions[start_id])
+            goal_node = grid.node_at(pin_positions[goal_id])
+            path_nodes = [pin_positions[start_id]] + \
+                [grid.pos_at(node) for node in routes[k]] + \
+                [pin_positions[goal_id]]
+            grid.set_path_costs(path_nodes)
+            path["corners"] = path_corners(path_nodes)
+            path["length"] = int(grid.g_cost[goal_node])+1
+            path["path_id"] = f"{start_id}->{goal_id}"
+            paths.append(path)
 
-        return pcb_dims
+        return paths, None, grid.routing_stats()
+
+    # Groups the connections list into nets: lists of pin ids that are all wired together.
+    # Nets (and the pins in them) are in the order they first show up in the connections list.
+    def get_nets(self):
+        net_of_pin = {}
+        nets = []
+        for pin_1_id, pin_2_id in self.connections_list:
+            net_1 = net_of_pin.get(pin_1_id)
+            net_2 = net_of_pin.get(pin_2_id)
+            if net_1 == None and net_2 == None:
+                net = [pin_1_id, pin_2_id]
+                nets.append(net)
+            elif net_2 == None:
+                net = net_1
+                net.append(pin_2_id)
+            elif net_1 == None:
+                net = net_2
+                net.append(pin_1_id)
+            elif net_1 is not net_2:
+                # This connection joins two nets together
+                net = net_1
+                net += net_2
+                nets.remove(net_2)
+            else:
+                continue
+            for pin_id in net:
+                net_of_pin[pin_id] = net
+        return nets
+
+    # Routes every net as a tree instead of routing each connection on its own. The first pin
+    # starts the tree, then the pin closest to the tree's pins gets a path to whichever grid space
+    # already on the tree is the best to branch from, and so on. Pins on the same net can share
+    # traces that way instead of getting in each other's way. Each branch is one path, named after
+    # the pin whose trace it branches from.
+    # Returns the paths, failed connection and routing_stats like run_a_star, where the failed
+    # connection is [the net's first pin, the pin that couldn't reach the net].
+    def route_net_trees(self, pin_positions, nets):
+        paths = []
+        grid = PcbGrid(self.n_grid_spaces + self.a_star_grid_padding, self.pcb_occupancy(pin_positions),
+                       self.routing_connectivity, self.heuristic_weight)
+
+        for net in nets:
+            # Which pin's trace each node on the tree belongs to
+            tree = {grid.node_at(pin_positions[net[0]]): net[0]}
+            unrouted = net[1:]
+            while len(unrouted) > 0:
+                # The next pin is the one closest to a pin already on the tree
+                pin_id = min(unrouted, key=lambda pin_id: min(self.connection_distance([pin_id, tree_pin_id], pin_positions)
+                                                              for tree_pin_id in net if not tree_pin_id in unrouted))
+                unrouted.remove(pin_id)
+
+                goal_node = grid.node_at(pin_positions[pin_id])
+                grid.unblock(goal_node)
+                no_paths = grid.a_star_from(list(tree), goal_node)
+                if no_paths:
+                    return [], [net[0], pin_id], grid.routing_stats()
+
+                path = {}
+                path_nodes = grid.retrace_path_from_any(goal_node)
+                branch_pin_id = tree[grid.node_at(path_nodes[0])]
+                grid.block_path(path_nodes[1:])
+                for pos in path_nodes[1:]:
+                    tree[grid.node_at(pos)] = pin_id
+                path["corners"] = path_corners(path_nodes)
+                path["length"] = int(grid.g_cost[goal_node])+1
+                path["path_id"] = f"{branch_pin_id}->{pin_id}"
+                paths.append(path)
+
+        return paths, None, grid.routing_stats()
+
+    # Routes the nets as trees (see route_net_trees). If a net can't be routed it gets moved to the
+    # front and everything is tried again, at most once per net order.
+    def run_net_trees(self, pin_positions):
+        nets = self.get_nets()
+        tried = set()
+        routing_stats = {}
+        failed_connection = None
+        while len(tried) < len(nets):
+            order_key = tuple(tuple(net) for net in nets)
+            if order_key in tried:
+                break
+            tried.add(order_key)
+
+            paths, failed_connection, net_stats = self.route_net_trees(pin_positions, nets)
+            add_routing_stats(routing_stats, net_stats)
+            if paths != []:
+                return paths, None, routing_stats
+
+            failed_net = [net for net in nets if failed_connection[1] in net][0]
+            nets.remove(failed_net)
+            nets.insert(0, failed_net)
+
+        return [], failed_connection, routing_stats
+
+    # Used to fit the grid to a bounding box of the points actually used in a Layout. Returns the dims
+    # of the box and the [i, j] offset that moves a grid space into it (leaving a space around the
+    # edge). The layout's paths and the components stay where they are.
+    def trim_pcb_layout(self, layout):
+        pcb_dims = self.pcb_area(layout.paths)
+        return pcb_dims, [1 - pcb_dims[0], 1 - pcb_dims[2]]
 
     # Converts the data in the schematic paths field to an actual image of traces and pad
     def convert_to_pcb_image(self):
+        self.converted_image = self.draw_layout(self.get_layout())
+
+    # Draws a Layout's traces, pads and labels and returns the image. Neither the layout nor the
+    # schematic gets changed, so any layout (like monte_carlo's best one so far) can be drawn.
+    def draw_layout(self, layout):
         # Get the settings:
         mode = self.converted_image_color_mode
         scale = self.converted_image_scaling
@@ -1001,7 +2686,8 @@ class Schematic:
         trace_color = self.converted_image_trace_color
 
         # fit the image to the used points
-        pcb_dims = self.trim_pcb_layout()
+        pcb_dims, offset = self.trim_pcb_layout(layout)
+        offset_i, offset_j = offset
 
         # Set the size of the image
         nj = abs(pcb_dims[3] - pcb_dims[2])
@@ -1019,51 +2705,54 @@ class Schematic:
         # the pad dimension
         box_w_h = 10
 
-        # draw each path from point to point
-        for path in self.paths:
-            nodes = path["path_nodes"]
-            points = []
+        # draw each path from corner to corner
+        for path in layout.paths:
+            nodes = path["corners"].tolist()
 
             # draw the lines for the traces
             for i in range(0, len(nodes) - 1):
                 i1, j1 = nodes[i]
                 i2, j2 = nodes[i+1]
-                draw.line((scale*j1, scale*i1, scale*j2, scale*i2),
+                draw.line((scale*(j1 + offset_j), scale*(i1 + offset_i), scale*(j2 + offset_j), scale*(i2 + offset_i)),
                           fill=trace_color, width=5)
 
         # draw each pad
-        for path in self.paths:
-            nodes = path["path_nodes"]
-
-            # setup and draw the pads
-            i_start, j_start = nodes[0]
-            i_start = scale*i_start - box_w_h/2
-            j_start = scale*j_start - box_w_h/2
-            i_goal, j_goal = nodes[-1]
-            i_goal = scale*i_goal - box_w_h/2
-            j_goal = scale*j_goal - box_w_h/2
+        for i_pad, j_pad in self.pad_positions(layout):
+            i_pad = scale*(i_pad + offset_i) - box_w_h/2
+            j_pad = scale*(j_pad + offset_j) - box_w_h/2
 
             # square rectangles as the pads
-            draw.rectangle((j_start, i_start, j_start+box_w_h,
-                            i_start+box_w_h), fill=trace_color, width=0)
-            draw.rectangle((j_goal, i_goal, j_goal+box_w_h, i_goal +
-                            box_w_h), fill=trace_color, width=0)
+            draw.rectangle((j_pad, i_pad, j_pad+box_w_h,
+                            i_pad+box_w_h), fill=trace_color, width=0)
 
         # Set up the labels for the component spots
-        self.set_labels_for_converted_image(draw, font, height)
-
-        # Set the image field to the completed image
-        self.converted_image = image
+        self.set_labels_for_converted_image(
+            draw, font, height, layout.pcb_positions(), offset)
+
+        return image
+
+    # Where draw_layout puts the pads: on every pin a path starts or ends at. A path can end on a
+    # trace instead of a pin (see route_net_trees), so the pads come from the pins in the path ids
+    # and not from the ends of the paths.
+    def pad_positions(self, layout):
+        pin_positions = self.pin_placement(layout.placement)
+        pad_pin_ids = []
+        for path in layout.paths:
+            for pin_id in path["path_id"].split("->"):
+                if not pin_id in pad_pin_ids:
+                    pad_pin_ids.append(pin_id)
+        return [pin_positions[pin_id] for pin_id in pad_pin_ids]
 
     # This whole thing just figures out where to place labels relative to the center of the pins for
     # a component. It doesn't completely work since the positions go all wacky for higher complexity
     # schematics. (-Jason)
-    def set_labels_for_converted_image(self, draw, font, height):
-        for component in self.components:
+    # pcb_positions are where every component is in the layout being drawn and pcb_offset moves
+    # them into the image (see trim_pcb_layout).
+    def set_labels_for_converted_image(self, draw, font, height, pcb_positions, pcb_offset):
+        for component, pin_positions in zip(self.components, pcb_positions):
             scale = self.converted_image_scaling
             trace_color = self.converted_image_trace_color
 
-            pin_positions = self.components[component].pcb_position
             di = (pin_positions[0][0] - pin_positions[1][0])
             dj = (pin_positions[0][1] - pin_positions[1][1])
 
@@ -1086,8 +2775,8 @@ class Schematic:
                     label_center_j = pin_positions[0][1]
                     label_center_i = pin_positions[1][0]+float(di)/2.0
 
-            label_center_i = (1 + label_center_i) * scale
-            label_center_j = (1 + label_center_j) * scale
+            label_center_i = (pcb_offset[0] + label_center_i) * scale
+            label_center_j = (pcb_offset[1] + label_center_j) * scale
 
             label_text = self.components[component].label
             text_size = font.getsize(label_text)
@@ -1108,3 +2797,98 @@ class Schematic:
 
             draw.text((label_center_j, label_center_i + reading_room), label_text,
                       fill=trace_color, font=font)
+
+
+# The starting colors for refine_colors: nodes with the same label get the same color
+def initial_colors(labels):
+    ordered_labels = sorted(set(labels.values()))
+    return {node: ordered_labels.index(label) for node, label in labels.items()}
+
+
+# Splits the colors of a graph's nodes (edges are [node, node, label]) until nodes with the same
+# color have the same number of edges of each label to nodes of each color. The new colors only
+# come from what the nodes look like, not what they're called, so two graphs that are the same
+# except for names end up colored the same way.
+# Returns the colors and what each color stands for (its old color and its neighbors' colors).
+def refine_colors(edges, colors):
+    neighbors = {node: [] for node in colors}
+    for node_1, node_2, label in edges:
+        neighbors[node_1].append((label, node_2))
+        neighbors[node_2].append((label, node_1))
+
+    while True:
+        signatures = {node: [colors[node], sorted([label, colors[neighbor]] for label, neighbor in neighbors[node])]
+                      for node in colors}
+        ordered_signatures = sorted({json.dumps(signature)
+                                     for signature in signatures.values()})
+        new_colors = {node: ordered_signatures.index(json.dumps(signature))
+                      for node, signature in signatures.items()}
+        if len(ordered_signatures) == len(set(colors.values())):
+            return new_colors, ordered_signatures
+        colors = new_colors
+
+
+# Finds a way to rename graph_1's nodes (see Schematic.topology_graph) so it's exactly graph_2.
+# Both graphs get colored together with refine_colors; nodes can only be matched if they have the
+# same color. When that isn't enough to tell nodes apart, a node of graph_1 is matched to each node
+# of graph_2 with its color in turn (giving both a new color of their own) until one works.
+# Returns {graph_1 node: graph_2 node} or None if they aren't the same.
+def find_isomorphism(graph_1, graph_2):
+    if len(graph_1["labels"]) != len(graph_2["labels"]) or len(graph_1["edges"]) != len(graph_2["edges"]):
+        return None
+    labels = {(g, node): label for g, graph in enumerate([graph_1, graph_2])
+              for node, label in graph["labels"].items()}
+    edges = [[(g, node_1), (g, node_2), label] for g, graph in enumerate([graph_1, graph_2])
+             for node_1, node_2, label in graph["edges"]]
+    edges_2 = {(node_1, node_2, label) for node_1, node_2, label in graph_2["edges"]}
+
+    def search(colors):
+        colors, _ = refine_colors(edges, colors)
+        cells = {}
+        for node, color in colors.items():
+            cells.setdefault(color, ([], []))[node[0]].append(node[1])
+        if any(len(cell[0]) != len(cell[1]) for cell in cells.values()):
+            return None
+
+        split_color = None
+        for color, cell in sorted(cells.items()):
+            if len(cell[0]) > 1:
+                split_color = color
+                break
+        if split_color == None:
+            mapping = {cell[0][0]: cell[1][0] for cell in cells.values()}
+            if all((mapping[node_1], mapping[node_2], label) in edges_2 for node_1, node_2, label in graph_1["edges"]):
+                return mapping
+            return None
+
+        node_1 = sorted(cells[split_color][0])[0]
+        for node_2 in sorted(cells[split_color][1]):
+            new_colors = {node: 2*color for node, color in colors.items()}
+            new_colors[(0, node_1)] -= 1
+            new_colors[(1, node_2)] -= 1
+            mapping = search(new_colors)
+            if mapping != None:
+                return mapping
+        return None
+
+    return search(initial_colors(labels))
+
+
+# Adds the counts in more_stats to routing_stats (see Schematic.reset_routing_stats)
+def add_routing_stats(routing_stats, more_stats):
+    for stat, count in more_stats.items():
+        routing_stats[stat] = routing_stats.get(stat, 0) + count
+
+
+# Runs one chunk of Schematic.parallel_monte_carlo on a copy of the schematic (schematic_json is its
+# to_dict as json, and routing_parameters are [connectivity, heuristic_weight] for
+# set_routing_parameters). It's a plain function so it can be sent to another process.
+# Returns [the best Layout (None if nothing could be routed), routing_stats].
+def run_monte_carlo_chunk(schematic_json, routing_parameters, max_iters, seed, monte_carlo_kwargs):
+    schematic = Schematic()
+    schematic.Schematic(json.loads(schematic_json))
+    schematic.set_routing_parameters(*routing_parameters)
+    best_layout = None
+    for event in schematic.monte_carlo_steps(max_iters, seed=seed, **monte_carlo_kwargs):
+        best_layout = event["best_layout"]
+    return [best_layout, schematic.routing_stats]
@@ -1,5 +1,8 @@
 import sys
+import os
 import platform
+import copy
+import threading
 from PySide2 import QtCore, QtGui, QtWidgets, QtSvg
 from PySide2.QtCore import (QCoreApplication, QPropertyAnimation, QDate, QDateTime, QMetaObject, QObject, QPoint, QRect, QSize, QTime, QUrl, Qt, QEvent)
 from PySide2.QtGui import (QBrush, QColor, QConicalGradient, QCursor, QFont, QFontDatabase, QIcon, QKeySequence, QLinearGradient, QPalette, QPainter, QPixmap, QRadialGradient)
@@ -97,6 +100,51 @@ class Component(QtWidgets.QGraphicsRectItem):
         self.pin0Connection = None
         self.pin1Connection = None
 
+# Runs Monte Carlo on a copy of the schematic in its own thread so the window doesn't freeze
+# while it searches. It sends how far along it is, a picture of every new best layout, and
+# the copy with the best layout (already converted to an image) when it's done.
+# A layout from layoutCache (or a placement from placementLibrary for a circuit with the same
+# topology) is used right away unless useLayoutCache is False.
+class LayoutWorker(QtCore.QThread):
+    progress = QtCore.Signal(int, float)
+    preview = QtCore.Signal(object)
+    done = QtCore.Signal(object)
+
+    def __init__(self, schematic, maxIters, layoutCache=None, useLayoutCache=True, placementLibrary=None, parent=None):
+        super().__init__(parent)
+        self.schematic = self.copySchematic(schematic)
+        self.schematic.layout_cache = layoutCache
+        self.schematic.placement_library = placementLibrary
+        self.maxIters = maxIters
+        self.useLayoutCache = useLayoutCache
+        self.cancel = threading.Event()
+
+    def run(self):
+        self.schematic.monte_carlo(self.maxIters, cancel=self.cancel, progress=self.sendProgress,
+                                   use_layout_cache=self.useLayoutCache)
+        if self.schematic.paths != None:
+            self.schematic.convert_to_pcb_image()
+        self.done.emit(self.schematic)
+
+    # Gets called by monte_carlo after every iteration
+    def sendProgress(self, event):
+        self.progress.emit(event["iteration"], float(event["best_score"]))
+        if event["new_best"]:
+            self.preview.emit(self.renderLayout(event["best_layout"]))
+
+    # Draws a best layout without committing it, so the search can keep going
+    def renderLayout(self, bestLayout):
+        return self.schematic.draw_layout(bestLayout)
+
+    # A separate schematic with the same components, connections and settings
+    def copySchematic(self, schematic):
+        schematicCopy = classes.Schematic()
+        schematicCopy.Schematic(copy.deepcopy(schematic.to_dict()))
+        schematicCopy.converted_image_bg_color = schematic.converted_image_bg_color
+        schematicCopy.converted_image_trace_color = schematic.converted_image_trace_color
+        schematicCopy.converted_image_scaling = schematic.converted_image_scaling
+        return schematicCopy
+
 class MainWindow(QMainWindow):
     def __init__(self):
 # ------------- Window set up
@@ -262,8 +310,31 @@ class MainWindow(QMainWindow):
         self.ui.slider_scaling.valueChanged.connect(lambda: self.updateSliderValue(self.ui.label_scaling_value, self.ui.slider_scaling))
 
         self.ui.btn_generate.clicked.connect(lambda: self.setupMonteCarlo())
-        self.ui.btn_generate_new.clicked.connect(lambda: self.setupMonteCarlo())
+        self.ui.btn_generate_new.clicked.connect(lambda: self.setupMonteCarlo(newLayout=True))
         self.ui.btn_save_layout.clicked.connect(lambda: self.saveImage())
+
+        # Progress bar and cancel button for while a layout is being generated
+        self.maxIters = 1000
+        # Layouts that have already been generated, so an unchanged circuit comes back right away
+        self.layoutCache = classes.LayoutCache(os.path.join(
+            os.path.expanduser("~"), ".circuit_board_designer", "layout_cache"))
+        # Placements that worked for circuits with the same topology
+        self.placementLibrary = classes.LayoutCache(os.path.join(
+            os.path.expanduser("~"), ".circuit_board_designer", "placement_library"))
+        self.layoutWorker = None
+        self.layoutImage = None
+        self.progressBar = QtWidgets.QProgressBar(self.ui.page_generated)
+        self.progressBar.setRange(0, self.maxIters)
+        self.progressBar.hide()
+        self.ui.verticalLayout_29.insertWidget(1, self.progressBar)
+        self.btn_cancel_generate = QtWidgets.QPushButton("Cancel", self.ui.frame)
+        self.btn_cancel_generate.setMinimumSize(QtCore.QSize(250, 60))
+        self.btn_cancel_generate.setMaximumSize(QtCore.QSize(250, 60))
+        self.btn_cancel_generate.setFont(self.ui.btn_generate_new.font())
+        self.btn_cancel_generate.setStyleSheet(self.ui.btn_generate_new.styleSheet())
+        self.btn_cancel_generate.hide()
+        self.ui.horizontalLayout_9.insertWidget(1, self.btn_cancel_generate)
+        self.btn_cancel_generate.clicked.connect(lambda: self.cancelMonteCarlo())
     
     # Updates the setting labels to their respective slider values
     def updateSliderValue(self, label, slider, target = False):
@@ -272,8 +343,8 @@ class MainWindow(QMainWindow):
         else:
             label.setText(str(slider.value()))
 
-    # Prepare the schematic to run Monte Carlo and A*
-    def setupMonteCarlo(self):
+    # Prepare the schematic to run Monte Carlo and A*. A new layout skips the cached one.
+    def setupMonteCarlo(self, newLayout=False):
         #print("HELLO0")
         self.grid = self.ui.slider_grid.value()
         self.padding = self.ui.slider_padding.value()
@@ -312,21 +383,69 @@ class MainWindow(QMainWindow):
             self.popupError("Ensure that all the components are connected to each other and form a closed loop.")
         elif len(self.components) == 0:
             self.popupError("The circuit is empty. Please design a circuit.")
+        elif self.layoutWorker == None:
+            self.startMonteCarlo(newLayout)
+
+    # Starts Monte Carlo in a LayoutWorker and shows the generated page with its progress
+    def startMonteCarlo(self, newLayout=False):
+        self.ui.btn_generate.setEnabled(False)
+        self.ui.btn_generate_new.setEnabled(False)
+        self.ui.btn_save_layout.setEnabled(False)
+        self.btn_cancel_generate.setEnabled(True)
+        self.btn_cancel_generate.show()
+        self.progressBar.setValue(0)
+        self.progressBar.setFormat("%p%")
+        self.progressBar.show()
+        self.ui.label_pcb_image.clear()
+        self.ui.stacked_workspaces.setCurrentWidget(self.ui.page_generated)
+
+        self.layoutWorker = LayoutWorker(self.schematic, self.maxIters, self.layoutCache, not newLayout,
+                                         self.placementLibrary)
+        self.layoutWorker.progress.connect(self.updateMonteCarloProgress)
+        self.layoutWorker.preview.connect(self.showLayoutImage)
+        self.layoutWorker.done.connect(self.finishMonteCarlo)
+        self.layoutWorker.start()
+
+    # Stops Monte Carlo early, keeping the best layout it has found so far
+    def cancelMonteCarlo(self):
+        if self.layoutWorker != None:
+            self.layoutWorker.cancel.set()
+            self.btn_cancel_generate.setEnabled(False)
+
+    def updateMonteCarloProgress(self, iteration, bestScore):
+        self.progressBar.setValue(iteration)
+        if bestScore >= 0:
+            self.progressBar.setFormat(f"%p%  Best score: {bestScore:.3f}")
+
+    # Shows a PCB layout image (PIL) in the generated page
+    def showLayoutImage(self, image):
+        # The pixmap can end up sharing the QImage's data, so hold on to it
+        self.layoutImage = ImageQt.ImageQt(image)
+        self.ui.label_pcb_image.setPixmap(QtGui.QPixmap.fromImage(self.layoutImage))
+
+    # Takes the best layout from the LayoutWorker's schematic once it's done
+    def finishMonteCarlo(self, schematic):
+        self.layoutWorker.wait()
+        self.layoutWorker = None
+        self.ui.btn_generate.setEnabled(True)
+        self.ui.btn_generate_new.setEnabled(True)
+        self.ui.btn_save_layout.setEnabled(True)
+        self.btn_cancel_generate.hide()
+        self.progressBar.hide()
+
+        if schematic.paths == None:
+            self.ui.stacked_workspaces.setCurrentWidget(self.ui.page_convert)
+            self.popupError("Cannot generate layout. Circuit may be impossible on single layer PCB. Try to change grid settings.")
         else:
-            self.schematic.monte_carlo()
-            if self.schematic.paths == None:
-                self.popupError("Cannot generate layout. Circuit may be impossible on single layer PCB. Try to change grid settings.")
-            else:
-                self.schematic.convert_to_pcb_image()
-                self.ui.stacked_workspaces.setCurrentWidget(self.ui.page_generated)
-                #print(self.schematic.converted_image)
-                #print("HELLO")
-                img = ImageQt.ImageQt(self.schematic.converted_image)
-                #print("HELLO@")
-                image = QtGui.QPixmap.fromImage(img)
-                #print("HELLO!")
-                self.ui.label_pcb_image.setPixmap(image)
-                #print("HELLO?")
+            for componentId, component in schematic.components.items():
+                if componentId in self.schematic.components:
+                    self.schematic.components[componentId].set_pcb_pos(component.pcb_position)
+            self.schematic.paths = schematic.paths
+            self.schematic.curr_runs_score = schematic.curr_runs_score
+            self.schematic.pin_placement_dict = schematic.pin_placement_dict
+            self.schematic.connections_list = schematic.connections_list
+            self.schematic.converted_image = schematic.converted_image
+            self.showLayoutImage(self.schematic.converted_image)
 
     # Save the PCB layout image
     def saveImage(self):
@@ -603,6 +722,13 @@ class MainWindow(QMainWindow):
         self.ui.window_canvas.centerOn(1500.0, 1000.0)
         self.ui.stacked_workspaces.setCurrentWidget(self.ui.page_design)
 
+    # Stops a running layout search before closing so its thread isn't destroyed while it runs
+    def closeEvent(self, event):
+        if self.layoutWorker != None:
+            self.layoutWorker.cancel.set()
+            self.layoutWorker.wait()
+        event.accept()
+
     # Calls popup error message box
     def popupError(self, text):
         msg = QtWidgets.QMessageBox()